@@ -0,0 +1,73 @@
+"""
+Benchmark the batched colour mapping engine (with a Matplotlib colour map, and with the built-in lookup table)
+against the original per-element loop.
+
+Usage (from the repo root):
+
+`python benchmarks/bench_colourmap.py --instances 1000 --features 256`
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import matplotlib as mpl
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from colourmap import ArrayBatch  # noqa: E402
+
+
+def loop_img_values(array, cmap, vmin, vmax):
+    """
+    The original ArrayMobject._calculate_img_values: one cmap call per element.
+    """
+    img_values = np.empty((1, len(array), 3))
+    norm = mpl.colors.Normalize(vmin=vmin, vmax=vmax)
+    for idx, v in enumerate(array):
+        img_values[:, idx, :] = cmap(norm(v.item()))[:3]
+    img_values *= 255
+    img_values = img_values.astype(np.uint8)
+    return img_values
+
+
+def run_loop(matrix, cmap):
+    return [loop_img_values(row, cmap, -1, 1) for row in matrix]
+
+
+def run_batch(matrix, cmap):
+    return ArrayBatch(matrix, cmap, -1, 1).row_textures()
+
+
+def run_lut(matrix):
+    return ArrayBatch(matrix, "viridis", -1, 1).row_textures()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", type=int, default=1000)
+    parser.add_argument("--features", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    cmap = mpl.colormaps["viridis"]
+    rng = np.random.default_rng(0)
+    matrix = rng.random((args.instances, args.features)) * 2 - 1
+
+    # Both implementations must produce identical textures
+    for expected, actual, lut in zip(run_loop(matrix[:10], cmap), run_batch(matrix[:10], cmap), run_lut(matrix[:10])):
+        assert np.array_equal(expected, actual)
+        assert np.array_equal(expected, lut)
+
+    loop_time = min(timeit.repeat(lambda: run_loop(matrix, cmap), number=1, repeat=args.repeats))
+    batch_time = min(timeit.repeat(lambda: run_batch(matrix, cmap), number=1, repeat=args.repeats))
+    lut_time = min(timeit.repeat(lambda: run_lut(matrix), number=1, repeat=args.repeats))
+    print("Bag of {:d} instances x {:d} features".format(args.instances, args.features))
+    print("  loop:  {:.4f}s".format(loop_time))
+    print("  batch: {:.4f}s ({:.0f}x faster)".format(batch_time, loop_time / batch_time))
+    print("  lut:   {:.4f}s ({:.0f}x faster)".format(lut_time, loop_time / lut_time))
+
+
+if __name__ == "__main__":
+    main()
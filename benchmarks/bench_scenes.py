@@ -0,0 +1,247 @@
+"""
+Benchmark how the MIL scenes and the mobjects and animations in util.py scale with bag size, and check the results
+against a stored baseline.
+
+Scene benchmarks build synthetic bags (a random image split into a square-ish grid, with random features and
+predictions) and time, per scene, bag size and feature width:
+    construct - loading the bag and building the scene's mobjects,
+    storyboard - running the whole pipeline with every animation skipped (no frames rendered),
+    render - rendering the video at low quality (only for bags up to --max-render-size instances).
+Micro-benchmarks time colour mapping, building and splitting arrays, ShrinkToPoint and patch loading.
+
+Labels use the digit atlas (MIL_LABEL_MODE=atlas), so no TeX install is needed.
+
+The default run covers bags of 9, 100 and 1000 instances. --large adds bags of 10,000 instances, which need several GB
+of memory (the 64-feature bag's atlas textures alone are ~7 GB), so only use it on a machine with room to spare.
+
+Regressions are only checked against a baseline: save one with --save-baseline on the machine the suite is run on
+(timings from a different machine aren't comparable).
+
+Usage (from the repo root):
+
+`python benchmarks/bench_scenes.py --output results.json`
+`python benchmarks/bench_scenes.py --large --scenes MILManim --modes construct storyboard`
+`python benchmarks/bench_scenes.py --save-baseline`
+`python benchmarks/bench_scenes.py --sizes 9 100 --threshold 0.25`  (exits with 1 if anything regressed)
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+os.environ.setdefault("MIL_LABEL_MODE", "atlas")
+
+import manim  # noqa: E402
+from manim import tempconfig  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from bags import Bag  # noqa: E402
+from colourmap import ArrayBatch  # noqa: E402
+from image_cache import patch_cache  # noqa: E402
+from mil_manim import MILManim  # noqa: E402
+from mil_manim_luc import MILManimLUC  # noqa: E402
+from util import ArrayMobject, ShrinkToPoint  # noqa: E402
+
+# Scene, and the number of classes it predicts
+SCENES = {"MILManim": (MILManim, 2), "MILManimLUC": (MILManimLUC, len(MILManimLUC.class_names))}
+# Bag sizes (instances) of the default run, and the sizes --large adds
+DEFAULT_SIZES = [9, 100, 1000]
+LARGE_SIZES = [10000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def grid_for(n_instances):
+    """
+    The most square grid with exactly n_instances patches.
+    """
+    n_rows = int(math.isqrt(n_instances))
+    while n_instances % n_rows:
+        n_rows -= 1
+    return n_rows, n_instances // n_rows
+
+
+def synthetic_bag(n_instances, n_features, work_dir, n_classes=2, patch_px=16, seed=0):
+    """
+    A bag of random data: an image that splits into n_instances patches, and features, attention and predictions.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows, n_cols = grid_for(n_instances)
+    image_path = os.path.join(work_dir, "bag_{:d}.png".format(n_instances))
+    if not os.path.exists(image_path):
+        pixels = rng.integers(0, 256, (n_rows * patch_px, n_cols * patch_px, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(image_path)
+    bag = Bag(
+        "synthetic_{:d}".format(n_instances),
+        image=image_path,
+        features=rng.random((n_instances, n_features)) * 2 - 1,
+        attention=rng.random(n_instances),
+        instance_preds=rng.dirichlet(np.ones(n_classes), n_instances),
+        bag_pred=rng.dirichlet(np.ones(n_classes)),
+        seed=seed,
+    )
+    return bag, (n_rows, n_cols)
+
+
+def time_scene(scene_cls, bag, grid_size, n_features, mode, media_dir):
+    """
+    Wall time of constructing, storyboarding or rendering the scene for a bag.
+    """
+    bench_cls = type(scene_cls.__name__, (scene_cls,), {"bag": bag, "grid_size": grid_size, "n_features": n_features})
+    options = {"quality": "low_quality", "preview": False, "disable_caching": True, "media_dir": media_dir,
+               "output_file": "{:s}_{:s}".format(scene_cls.__name__, bag.name)}
+    if mode == "storyboard":
+        options.update(skip_animations=True, write_to_movie=False, save_last_frame=False)
+    with tempconfig(options):
+        scene = bench_cls()
+        start = timeit.default_timer()
+        if mode == "construct":
+            scene.setup()
+            scene.load_data()
+            scene.build_mobjects()
+            scene.build_patches()
+        else:
+            scene.render()
+        return timeit.default_timer() - start
+
+
+def best_time(func, repeats):
+    return min(timeit.repeat(func, number=1, repeat=repeats))
+
+
+def micro_benchmarks(n_instances, n_features, work_dir, repeats):
+    """
+    Times of the building blocks used for every instance, for a bag of the given size.
+    """
+    rng = np.random.default_rng(0)
+    matrix = rng.random((n_instances, n_features)) * 2 - 1
+    batch = ArrayBatch(matrix, "viridis", -1, 1)
+    arrays = [ArrayMobject.from_batch(batch, idx) for idx in range(min(n_instances, 100))]
+    bag, grid_size = synthetic_bag(n_instances, n_features, work_dir)
+
+    def shrink_to_point():
+        array = arrays[0].copy()
+        animation = ShrinkToPoint(array, np.zeros(3))
+        animation.begin()
+        for frame in range(15):
+            animation.interpolate(frame / 14)
+
+    def load_patches():
+        tiler = bag.tiler(grid_size)
+        for row in range(grid_size[0]):
+            for col in range(grid_size[1]):
+                patch_cache.image_mobject(tiler.patch(row, col), height=0.6)
+
+    return {
+        # Colour mapping the whole bag (previously ArrayMobject._calculate_img_values, one row at a time)
+        "colour_map": best_time(lambda: ArrayBatch(matrix, "viridis", -1, 1).row_textures(), repeats),
+        # Building the arrays for the whole bag (previously create_mobject)
+        "array_mobjects": best_time(lambda: [ArrayMobject.from_batch(batch, idx) for idx in range(n_instances)],
+                                    repeats),
+        # Splitting arrays into their cells (previously create_splits), for up to 100 arrays
+        "split_cells": best_time(lambda: [a.split_cells() for a in arrays], repeats),
+        # One second of a ShrinkToPoint at low quality (15 frames)
+        "shrink_to_point": best_time(shrink_to_point, repeats),
+        # Decoding the bag image, tiling it and building the (cached) patch images
+        "patch_loading": best_time(load_patches, repeats),
+    }
+
+
+def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        media_dir = os.path.join(work_dir, "media")
+        with tempconfig({"quality": "low_quality", "media_dir": media_dir}):
+            for n_instances in args.sizes:
+                for n_features in args.features:
+                    times = micro_benchmarks(n_instances, n_features, work_dir, args.repeats)
+                    for name, elapsed in times.items():
+                        results["micro/{:s}/{:d}x{:d}".format(name, n_instances, n_features)] = elapsed
+        for scene_name in args.scenes:
+            for n_instances in args.sizes:
+                for n_features in args.features:
+                    scene_cls, n_classes = SCENES[scene_name]
+                    bag, grid_size = synthetic_bag(n_instances, n_features, work_dir, n_classes)
+                    for mode in args.modes:
+                        if mode == "render" and n_instances > args.max_render_size:
+                            continue
+                        key = "scene/{:s}/{:s}/{:d}x{:d}".format(scene_name, mode, n_instances, n_features)
+                        results[key] = time_scene(scene_cls, bag, grid_size, n_features, mode, media_dir)
+                        print("{:s}: {:.3f}s".format(key, results[key]), flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Benchmarks that got more than threshold (a fraction) slower than the baseline.
+    """
+    regressions = {}
+    for key, elapsed in results.items():
+        expected = baseline.get(key)
+        if expected is not None and elapsed > expected * (1 + threshold):
+            regressions[key] = {"baseline": expected, "time": elapsed, "slowdown": elapsed / expected}
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", nargs="+", choices=SCENES.keys(), default=list(SCENES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Bag sizes (instances)")
+    parser.add_argument("--large", action="store_true",
+                        help="Also run bags of {:s} instances (needs several GB of memory)".format(
+                            ", ".join(str(size) for size in LARGE_SIZES)))
+    parser.add_argument("--features", nargs="+", type=int, default=[7, 64], help="Feature widths")
+    parser.add_argument("--modes", nargs="+", choices=("construct", "storyboard", "render"),
+                        default=["construct", "storyboard", "render"])
+    parser.add_argument("--max-render-size", type=int, default=100, help="Largest bag to render video for")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeats of each micro-benchmark (best is kept)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results (JSON)")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Fraction slower than the baseline that counts as a regression")
+    parser.add_argument("--output", default=None, help="Path to write the results to (JSON)")
+    args = parser.parse_args()
+    if args.large:
+        args.sizes = args.sizes + [size for size in LARGE_SIZES if size not in args.sizes]
+
+    results = run(args)
+    report = {
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "manim": manim.__version__,
+                        "machine": platform.machine(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+        report["results"] = {**baseline, **results}
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("Baseline saved to {:s}".format(args.baseline))
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        report["regressions"] = compare(results, baseline, args.threshold)
+        for key, regression in report["regressions"].items():
+            print("REGRESSION {:s}: {:.3f}s vs {:.3f}s baseline ({:.2f}x)".format(
+                key, regression["time"], regression["baseline"], regression["slowdown"]))
+    else:
+        print("No baseline at {:s}, so no regressions were checked (save one with --save-baseline)".format(
+            args.baseline), file=sys.stderr)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import zipfile
+from functools import lru_cache
+
+import numpy as np
+from manim import logger
+
+
+def _npz_member_name(key):
+    return key if key.endswith(".npy") else key + ".npy"
+
+
+def mmap_npz(path, key):
+    """
+    Memory-map one array of an .npz archive. Only arrays stored uncompressed (np.savez, not np.savez_compressed)
+    can be memory-mapped; compressed arrays are loaded in full.
+    """
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(_npz_member_name(key))
+    if info.compress_type != zipfile.ZIP_STORED:
+        logger.warning("{:s}[{:s}] is compressed, so it is loaded in full rather than memory-mapped".format(path, key))
+        with np.load(path) as npz:
+            return npz[key]
+    with open(path, "rb") as f:
+        # The member data follows its local file header (30 bytes plus the name and extra fields)
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape, order="F" if fortran_order else "C", offset=offset)
+
+
+@lru_cache(maxsize=None)
+def open_array(path, key=None):
+    """
+    Memory-map an array from a .npy file, or from an .npz file (key is the array's name in the archive).
+    Nothing is read until the array is indexed, and then only the pages holding the indexed elements.
+    """
+    if path.endswith(".npz"):
+        if key is None:
+            raise ValueError("An array name is needed to load from {:s}".format(path))
+        return mmap_npz(path, key)
+    return np.load(path, mmap_mode="r")
+
+
+def parse_source(source):
+    """
+    Split an array source of the form "path.npz:name" into (path, name). Other sources are returned unchanged.
+    """
+    if isinstance(source, str) and ".npz:" in source:
+        path, key = source.rsplit(":", 1)
+        return path, key
+    return source, None
+
+
+def load_rows(source, indices, n_cols=None, default_key=None):
+    """
+    Load the given rows (and optionally only the first n_cols columns) of an array source as a new in-memory array.
+    The source is an array(-like), a .npy path, or an .npz path (optionally "path.npz:name", else default_key).
+    """
+    path, key = parse_source(source)
+    if isinstance(path, str):
+        array = open_array(path, key or default_key)
+    else:
+        array = np.asarray(path)
+    indices = np.asarray(indices)
+    if n_cols is None:
+        return np.array(array[indices])
+    return np.array(array[indices, :n_cols])
+
+
+def load_array(source, default_key=None):
+    """
+    Load a (small) array source in full, e.g. a bag prediction.
+    """
+    path, key = parse_source(source)
+    if isinstance(path, str):
+        return np.array(open_array(path, key or default_key))
+    return np.asarray(path)
@@ -0,0 +1,121 @@
+import json
+import os
+
+import numpy as np
+
+from bag_data import load_array, load_rows
+from tiler import ImageTiler
+
+
+class Bag:
+    """
+    The data a MIL scene is rendered for: the bag image and the model's outputs for it.
+
+    The image is either a single file (image) that is split into patches, or one file per patch
+    (patch_format, e.g. "img/crc/crc_{row:d}_{col:d}.png").
+
+    The model outputs (features, attention, instance_preds, bag_pred) are each either an array(-like) or a file:
+    a .npy path, or an .npz path ("path.npz:name", or just "path.npz" if the array is named after the field).
+    Files are memory-mapped and only the rows of the instances shown (instances) are read, so bags can have far more
+    instances and features than the scene shows.
+    Outputs that aren't given are left for the scene to fill in (see the scene's load_data).
+
+    Alternatively, model is the path of a model checkpoint to run over the bag's patches to get its outputs
+    (see inference.py; requires PyTorch). The outputs are cached, so the model is only run once per bag.
+    """
+
+    # Model outputs that can be given as files
+    data_fields = ("features", "attention", "instance_preds", "bag_pred")
+
+    def __init__(self, name, image=None, patch_format=None, features=None, attention=None, instance_preds=None,
+                 bag_pred=None, instances=None, label=None, seed=0, model=None):
+        if (image is None) == (patch_format is None):
+            raise ValueError("Bag {:s} needs exactly one of image or patch_format".format(name))
+        self.name = name
+        self.image = image
+        self.patch_format = patch_format
+        self.features = features
+        self.attention = attention
+        self.instance_preds = instance_preds
+        self.bag_pred = bag_pred
+        # Indices of the instances shown as the scene's patches (defaults to the first instances)
+        self.instances = instances
+        # True class proportions of the bag, if known
+        self.label = None if label is None else np.asarray(label, dtype=float)
+        # Seed for any random placeholder data
+        self.seed = seed
+        # Model checkpoint to run over the patches, if any
+        self.model = model
+
+    @classmethod
+    def from_dict(cls, d, base_dir="."):
+        """
+        Create a bag from a manifest entry. Relative image and data paths are resolved against base_dir.
+        """
+        d = dict(d)
+        for key in ("image", "patch_format", "model") + cls.data_fields:
+            if isinstance(d.get(key), str):
+                d[key] = os.path.join(base_dir, d[key])
+        return cls(**d)
+
+    def instance_indices(self, n_instances):
+        """
+        Indices of the n_instances instances shown in the scene.
+        """
+        if self.instances is None:
+            return np.arange(n_instances)
+        indices = np.asarray(self.instances)
+        if indices.shape != (n_instances,):
+            raise ValueError("Bag {:s} shows {:d} instances, but the scene has {:d}".format(
+                self.name, len(indices), n_instances))
+        return indices
+
+    def instance_data(self, field, n_instances, n_cols=None):
+        """
+        The given model output for the instances shown (optionally only its first n_cols columns),
+        or None if the bag doesn't have it.
+        """
+        source = getattr(self, field)
+        if source is None:
+            return None
+        return load_rows(source, self.instance_indices(n_instances), n_cols, default_key=field).astype(float)
+
+    def bag_data(self, field):
+        """
+        The given bag-level model output, or None if the bag doesn't have it.
+        """
+        source = getattr(self, field)
+        if source is None:
+            return None
+        return load_array(source, default_key=field).astype(float)
+
+    def tiler(self, grid_size, executor=None):
+        if self.image is not None:
+            return ImageTiler.from_file(self.image, grid_size)
+        return ImageTiler.from_patch_files(self.patch_format, grid_size, executor)
+
+    def __repr__(self):
+        return "Bag({:s})".format(self.name)
+
+
+def load_bags(path):
+    """
+    Load bags from either:
+        a JSON manifest: a list of bag entries (see Bag.from_dict), with paths relative to the manifest, or
+        a directory: one sub-directory per bag, each with a bag.json entry (the bag name defaults to the directory).
+    """
+    if os.path.isfile(path):
+        with open(path) as f:
+            entries = json.load(f)
+        return [Bag.from_dict(entry, os.path.dirname(path)) for entry in entries]
+    bags = []
+    for name in sorted(os.listdir(path)):
+        bag_dir = os.path.join(path, name)
+        bag_path = os.path.join(bag_dir, "bag.json")
+        if not os.path.isfile(bag_path):
+            continue
+        with open(bag_path) as f:
+            entry = json.load(f)
+        entry.setdefault("name", name)
+        bags.append(Bag.from_dict(entry, bag_dir))
+    return bags
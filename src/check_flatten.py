@@ -0,0 +1,72 @@
+"""
+Check that flattening mobjects into a static layer (see MILScene.flatten) leaves the frame unchanged, for the kinds of
+mobject the MIL scenes flatten: half-opacity ghosts of patch images (with some transparent pixels) and of arrays,
+semi-transparent shapes and text. Some ghosts are faded in by a LaggedStart, so they end up inside its group in the
+scene, as the batched ghosts of the MIL scenes do.
+
+Every frame is drawn from scratch before and after flattening, and the largest change to any pixel is reported.
+Exits with 1 if it's more than MILScene.flatten_tolerance.
+
+Usage (from the src directory):
+
+`python check_flatten.py -q l`
+"""
+import argparse
+import sys
+
+from manim import *
+
+from mil_scene import MILScene
+from render_sections import QUALITIES
+from util import ArrayMobject, FadeGhost, ghost
+
+
+class FlattenCheck(MILScene):
+    check_flatten = True
+
+    def construct(self):
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+        # Opaque, apart from a transparent corner and a half-transparent band
+        pixels[..., 3] = 255
+        pixels[:4, :4, 3] = 0
+        pixels[8:10, :, 3] = 128
+        patches = Group(*[ImageMobject(pixels) for _ in range(6)])
+        for patch in patches:
+            patch.height = 1
+        patches.arrange(RIGHT, buff=0.2).shift(UP)
+        arrays = Group(*[ArrayMobject(rng.random(7), "viridis", 0, 1) for _ in range(2)]).arrange(DOWN).shift(DOWN)
+        square = Square(fill_color=BLUE, fill_opacity=0.5).shift(2 * DOWN + 3 * RIGHT)
+        text = Text("Features", font_size=50, color=BLACK).shift(3 * UP)
+        self.add(square, text)
+
+        patch_ghosts = [ghost(p) for p in patches]
+        array_ghosts = [ghost(a) for a in arrays]
+        self.play(FadeGhost(patch_ghosts[0]), FadeGhost(array_ghosts[0]))
+        self.play(LaggedStart(*[FadeGhost(g) for g in patch_ghosts[1:] + array_ghosts[1:]], lag_ratio=0.2))
+        self.flatten(*patch_ghosts, *array_ghosts, square, text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-q", "--quality", choices=QUALITIES.keys(), default="l")
+    args = parser.parse_args()
+
+    options = {
+        "quality": QUALITIES[args.quality],
+        "preview": False,
+        "skip_animations": True,
+        "write_to_movie": False,
+        "save_last_frame": False,
+    }
+    with tempconfig(options):
+        scene = FlattenCheck()
+        scene.render()
+    error = max(scene.flatten_errors)
+    print("Largest pixel change: {:d} (tolerance {:d})".format(error, scene.flatten_tolerance))
+    if error > scene.flatten_tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from functools import lru_cache
+
+import numpy as np
+
+from colourmap_luts import LUTS
+
+
+@lru_cache(maxsize=None)
+def get_lut(name):
+    """
+    Lookup table (N x 3 uint8, read-only) for a named colour map.
+    Built-in maps (see colourmap_luts.py) need no Matplotlib; any other name is looked up in Matplotlib.
+    """
+    if name in LUTS:
+        lut = np.frombuffer(bytes.fromhex(LUTS[name]), dtype=np.uint8).reshape(-1, 3)
+    else:
+        # Only imported when a colour map that isn't built in is used, as it's slow to import
+        import matplotlib as mpl
+        cmap = mpl.colormaps[name]
+        lut = (np.asarray(cmap(np.arange(cmap.N)))[:, :3] * 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def lookup(normed, lut):
+    """
+    Colour normalised values with a lookup table, in the same way as Matplotlib colour maps do:
+    values below 0 or above 1 get the first or last colour, and NaN values are black.
+    """
+    normed = np.asarray(normed, dtype=float)
+    nan = np.isnan(normed)
+    n = len(lut)
+    idx = np.clip(np.where(nan, 0, normed * n), 0, n - 1).astype(np.intp)
+    rgb = lut[idx]
+    rgb[nan] = 0
+    return rgb
+
+
+def colour_map_matrix(matrix, cmap, vmin, vmax):
+    """
+    Normalise and colour map a whole (N x F) matrix in one vectorised pass.
+    cmap is the name of a colour map (see get_lut) or a callable such as a Matplotlib colour map.
+    Returns a uint8 buffer of shape (N, F, 3).
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    # Same behaviour as mpl.colors.Normalize: a zero range maps everything to 0
+    if vmax == vmin:
+        normed = np.zeros_like(matrix)
+    else:
+        normed = (matrix - vmin) / (vmax - vmin)
+    if isinstance(cmap, str):
+        return lookup(normed, get_lut(cmap))
+    # Colormaps accept arrays, so the whole matrix is looked up at once
+    #  Truncating (rather than rounding) to uint8 matches the original per-element loop
+    rgb = np.asarray(cmap(normed))[..., :3] * 255
+    return rgb.astype(np.uint8)
+
+
+class ArrayBatch:
+    """
+    A batch of arrays (N x F) that are colour mapped together.
+    Each row's texture is a view of a single shared uint8 buffer of shape (N, F, 3).
+    """
+
+    def __init__(self, matrix, cmap, vmin, vmax):
+        matrix = np.asarray(matrix, dtype=float)
+        self.matrix = matrix.reshape(len(matrix), -1)
+        self.cmap = cmap
+        self.vmin = vmin
+        self.vmax = vmax
+        self.img_values = colour_map_matrix(self.matrix, cmap, vmin, vmax)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def row_texture(self, idx):
+        """
+        Texture for a single row, as a (1, F, 3) view of the shared buffer.
+        """
+        return self.img_values[idx:idx + 1]
+
+    def row_textures(self):
+        return [self.row_texture(idx) for idx in range(len(self))]
@@ -0,0 +1,66 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Bitmap glyphs for the characters used by value labels (7 pixels high, variable width)
+_GLYPH_ROWS = {
+    "0": [".###.", "#...#", "#..##", "#.#.#", "##..#", "#...#", ".###."],
+    "1": ["..#..", ".##..", "..#..", "..#..", "..#..", "..#..", ".###."],
+    "2": [".###.", "#...#", "....#", "...#.", "..#..", ".#...", "#####"],
+    "3": ["#####", "...#.", "..#..", "...#.", "....#", "#...#", ".###."],
+    "4": ["...#.", "..##.", ".#.#.", "#..#.", "#####", "...#.", "...#."],
+    "5": ["#####", "#....", "####.", "....#", "....#", "#...#", ".###."],
+    "6": ["..##.", ".#...", "#....", "####.", "#...#", "#...#", ".###."],
+    "7": ["#####", "....#", "...#.", "..#..", ".#...", ".#...", ".#..."],
+    "8": [".###.", "#...#", "#...#", ".###.", "#...#", "#...#", ".###."],
+    "9": [".###.", "#...#", "#...#", ".####", "....#", "...#.", ".##.."],
+    "-": ["....", "....", "....", "####", "....", "....", "...."],
+    ".": ["..", "..", "..", "..", "..", "##", "##"],
+}
+GLYPH_HEIGHT = 7
+
+# The pre-rasterized atlas: one boolean mask per character
+ATLAS = {
+    char: np.array([[c == "#" for c in row] for row in rows], dtype=bool)
+    for char, rows in _GLYPH_ROWS.items()
+}
+
+
+@lru_cache(maxsize=None)
+def render_label(text):
+    """
+    Rasterize a label into a boolean mask (GLYPH_HEIGHT x width) using the atlas, with one pixel between glyphs.
+    Labels are cached as most values repeat.
+    """
+    pieces = []
+    for char in text:
+        if pieces:
+            pieces.append(np.zeros((GLYPH_HEIGHT, 1), dtype=bool))
+        pieces.append(ATLAS[char])
+    mask = np.concatenate(pieces, axis=1)
+    mask.flags.writeable = False
+    return mask
+
+
+def stamp_labels(img_values, labels, cell_px=40, colour=(255, 255, 255), text_height=0.3):
+    """
+    Upscale a (1 x F x 3) texture so each cell is cell_px square, and draw each cell's label into it.
+    text_height is the height of the labels as a fraction of the cell height.
+    """
+    n_cells = img_values.shape[1]
+    texture = np.repeat(np.repeat(img_values, cell_px, axis=0), cell_px, axis=1)
+    glyph_scale = max(1, int(round(text_height * cell_px / GLYPH_HEIGHT)))
+    for idx, text in enumerate(labels[:n_cells]):
+        mask = render_label(text)
+        if glyph_scale > 1:
+            mask = np.kron(mask, np.ones((glyph_scale, glyph_scale), dtype=bool))
+        height, width = mask.shape
+        # Labels wider than the cell are clipped symmetrically
+        if width > cell_px:
+            crop = (width - cell_px) // 2
+            mask = mask[:, crop:crop + cell_px]
+            width = cell_px
+        top = (cell_px - height) // 2
+        left = idx * cell_px + (cell_px - width) // 2
+        texture[top:top + height, left:left + width][mask] = colour
+    return texture
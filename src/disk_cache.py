@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+
+def hash_array(array):
+    """
+    Content hash of an array (including its shape and dtype).
+    """
+    digest = hashlib.sha1(repr((array.shape, array.dtype.str)).encode())
+    digest.update(memoryview(np.ascontiguousarray(array)).cast("B"))
+    return digest.hexdigest()
+
+
+def fingerprint(*objects):
+    """
+    Content hash of (nested lists/tuples/dicts of) arrays, strings, bytes and numbers.
+    Raises TypeError for anything else (e.g. objects, or arrays of them), as it has no stable content to hash.
+    """
+    digest = hashlib.sha1()
+
+    def update(obj):
+        if isinstance(obj, (list, tuple)):
+            digest.update("[{:d}".format(len(obj)).encode())
+            for item in obj:
+                update(item)
+            digest.update(b"]")
+        elif isinstance(obj, dict):
+            update(sorted(obj.items()))
+        elif isinstance(obj, bytes):
+            digest.update(obj)
+        elif isinstance(obj, (str, int, float, bool, type(None))):
+            digest.update(repr(obj).encode())
+        else:
+            # Arrays and anything array-like (e.g. tensors)
+            array = np.asarray(obj)
+            if array.dtype.hasobject:
+                # Object arrays hold pointers, which differ between processes
+                raise TypeError("Can't fingerprint {:s} objects".format(type(obj).__name__))
+            digest.update(hash_array(array).encode())
+
+    update(objects)
+    return digest.hexdigest()
+
+
+def temp_path(path):
+    """
+    Per-process (and per-thread) temporary path to write to before renaming into place,
+    so parallel renders never read a half written file.
+    """
+    root, ext = os.path.splitext(path)
+    return "{:s}.{:d}_{:d}.tmp{:s}".format(root, os.getpid(), threading.get_ident(), ext)
+
+
+def touch(path):
+    """
+    Mark an entry as used, so eviction is least recently used rather than least recently written.
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict_lru(cache_dir, max_bytes, suffix):
+    """
+    Delete the least recently used entries (files ending in suffix) until the directory is within max_bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(suffix) and ".tmp" not in name:
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            # Already evicted by another render process
+            pass
+        total -= size
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    Content hash of a file (e.g. a model checkpoint), read in chunks.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
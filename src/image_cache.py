@@ -0,0 +1,182 @@
+import math
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from manim import *
+from PIL import Image
+
+from disk_cache import evict_lru, hash_array, temp_path, touch
+
+
+def display_pixels(height):
+    """
+    Number of pixels that a length (in scene units) covers at the active render quality.
+    """
+    return max(1, int(math.ceil(height * config.pixel_height / config.frame_height)))
+
+
+class PatchImageCache:
+    """
+    Cache of patch images resampled to the pixel size they'll actually occupy at the active render quality.
+    Resampled patches are kept in memory and on disk, keyed by source hash and target size.
+    Patches are only ever downsampled; if the source is already small enough it is used as is.
+    """
+
+    def __init__(self, cache_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self._cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._images = {}
+
+    @property
+    def cache_dir(self):
+        # Resolved lazily so the cache follows any changes to the Manim config (e.g. --media_dir)
+        if self._cache_dir is None:
+            return os.path.join(config.media_dir, "image_cache")
+        return self._cache_dir
+
+    def resample(self, pixels, height):
+        """
+        Resample an (H x W x C) patch so that it is no larger than needed to be displayed at the given height.
+        """
+        target_height = display_pixels(height)
+        if target_height >= pixels.shape[0]:
+            return pixels
+        target_width = max(1, int(round(pixels.shape[1] * target_height / pixels.shape[0])))
+        key = "{:s}_{:d}x{:d}".format(hash_array(pixels), target_width, target_height)
+        resampled = self._images.get(key)
+        if resampled is None:
+            resampled = self._load(key)
+            if resampled is None:
+                image = Image.fromarray(np.ascontiguousarray(pixels))
+                resampled = np.asarray(image.resize((target_width, target_height), Image.LANCZOS))
+                self._save(key, resampled)
+            resampled.flags.writeable = False
+            self._images[key] = resampled
+        return resampled
+
+    def image_mobject(self, pixels, height):
+        """
+        Create an ImageMobject of the given height from a patch, via the cache.
+        """
+        img = ImageMobject(self.resample(pixels, height))
+        img.height = height
+        return img
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def _load(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            pixels = np.load(path)
+        except (OSError, ValueError):
+            # Corrupt or partially written entry, so just rebuild it
+            return None
+        touch(path)
+        return pixels
+
+    def _save(self, key, pixels):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = temp_path(path)
+        np.save(tmp_path, pixels)
+        os.replace(tmp_path, path)
+        evict_lru(self.cache_dir, self.max_disk_bytes, ".npy")
+
+
+# Shared by all scenes
+patch_cache = PatchImageCache()
+
+
+class PatchLoader:
+    """
+    Loads a bag's patches in the background, so the scene doesn't wait on decoding them before its first frames.
+    No threads are started until prefetch is called: the bag's patch files are then decoded concurrently in a thread
+    pool, and every patch is also resampled for display (via patch_cache) in the pool. If the tiler is needed before
+    that (e.g. to fingerprint the scene's sections), the image is decoded on the calling thread instead.
+    image_mobjects hands over the finished patches in grid order, only waiting for any that aren't ready yet.
+
+    The pool is shut down by image_mobjects or close, so close the loader (or use it as a context manager) if the
+    patches might not be handed over.
+    """
+
+    def __init__(self, bag, grid_size, n_workers=None):
+        self.bag = bag
+        self.grid_size = grid_size
+        self.n_workers = n_workers
+        self._pool = None
+        self._tiler = None
+        self._resampled = None
+        self.height = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def tiler(self):
+        """
+        The bag's image tiler, once its image has been decoded.
+        """
+        if self._tiler is None:
+            self._tiler = Future()
+            self._tiler.set_result(self.bag.tiler(self.grid_size))
+        return self._tiler.result()
+
+    def prefetch(self, height):
+        """
+        Start decoding the image (if it hasn't been already), then resampling every patch for display at the given
+        height, in the background.
+        """
+        self.height = height
+        self._pool = ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix="patch_loader")
+        if self._tiler is None:
+            # The tiler waits on the decoding in the pool, so it's built on its own thread
+            tiler_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="patch_tiler")
+            self._tiler = tiler_thread.submit(self.bag.tiler, self.grid_size, self._pool)
+            tiler_thread.shutdown(wait=False)
+        self._resampled = Future()
+        self._tiler.add_done_callback(self._submit_resampling)
+
+    def _submit_resampling(self, tiler_future):
+        try:
+            tiler = tiler_future.result()
+            n_rows, n_cols = self.grid_size
+            self._resampled.set_result([
+                [self._pool.submit(patch_cache.resample, tiler.patch(row, col), self.height) for col in range(n_cols)]
+                for row in range(n_rows)
+            ])
+        except Exception as e:
+            self._resampled.set_exception(e)
+
+    def image_mobjects(self):
+        """
+        Grid (R x C object array) of ImageMobjects of the patches at the prefetched height, built in grid order.
+        """
+        if self._resampled is None:
+            raise RuntimeError("Call prefetch before getting the patches")
+        futures = self._resampled.result()
+        images = np.empty(self.grid_size, dtype=object)
+        for row, row_futures in enumerate(futures):
+            for col, future in enumerate(row_futures):
+                images[row, col] = ImageMobject(future.result())
+                images[row, col].height = self.height
+        self.close()
+        return images
+
+    def close(self):
+        """
+        Cancel any patches that haven't started resampling yet and shut down the pool. Safe to call more than once.
+        """
+        if self._pool is None:
+            return
+        if self._resampled.done() and self._resampled.exception() is None:
+            for row_futures in self._resampled.result():
+                for future in row_futures:
+                    future.cancel()
+        # Resampling that would start after this fails with the pool's shutdown error
+        self._pool.shutdown(wait=False)
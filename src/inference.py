@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+from manim import config, logger
+
+from disk_cache import evict_lru, fingerprint, hash_array, hash_file, temp_path, touch
+
+# The three parts of a MIL model checkpoint, in the order they're run
+MODEL_PARTS = ("feature_extractor", "aggregator", "classifier")
+
+
+def load_model(path):
+    """
+    Load a MIL model checkpoint on the CPU: a dict of torch modules (see MODEL_PARTS), saved with torch.save.
+    """
+    try:
+        import torch
+    except ImportError:
+        raise ImportError("Running a bag's model requires PyTorch (pip install torch)")
+    checkpoint = torch.load(path, map_location="cpu", weights_only=False)
+    missing = [part for part in MODEL_PARTS if part not in checkpoint]
+    if missing:
+        raise ValueError("Model checkpoint {:s} is missing {:s}".format(path, ", ".join(missing)))
+    return [checkpoint[part].eval() for part in MODEL_PARTS]
+
+
+def run_model(model_path, patches, batch_size=64):
+    """
+    Run a MIL model over a bag of patches (N x H x W x C uint8), extracting features in batches of batch_size.
+    The patches are given to the feature extractor as N x 3 x H x W float tensors in [0, 1].
+    The aggregator takes all the features (N x F) and returns the bag embedding, or (embedding, attention).
+    The classifier takes the bag embedding and returns the bag prediction.
+    """
+    import torch
+
+    feature_extractor, aggregator, classifier = load_model(model_path)
+    with torch.no_grad():
+        features = []
+        for start in range(0, len(patches), batch_size):
+            batch = np.ascontiguousarray(patches[start:start + batch_size, :, :, :3].transpose(0, 3, 1, 2))
+            features.append(feature_extractor(torch.from_numpy(batch).float() / 255).reshape(len(batch), -1))
+        features = torch.cat(features)
+        aggregation = aggregator(features)
+        attention = None
+        if isinstance(aggregation, tuple):
+            aggregation, attention = aggregation
+        bag_pred = classifier(aggregation)
+
+    outputs = {
+        "features": features.numpy().astype(float),
+        "aggregation": aggregation.numpy().astype(float).ravel(),
+        "bag_pred": bag_pred.numpy().astype(float).ravel(),
+    }
+    if attention is not None:
+        outputs["attention"] = attention.numpy().astype(float).ravel()
+    return outputs
+
+
+class InferenceCache:
+    """
+    Model outputs on disk, keyed by model checkpoint and bag image, so a bag only ever goes through a model once.
+    Least recently used outputs are evicted once the cache grows beyond max_bytes.
+    """
+
+    # Bump if the cached outputs change
+    version = 1
+
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024):
+        self._cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def cache_dir(self):
+        # Resolved lazily so the cache follows any changes to the Manim config (e.g. --media_dir)
+        if self._cache_dir is None:
+            return os.path.join(config.media_dir, "inference_cache")
+        return self._cache_dir
+
+    def key(self, model_path, tiler):
+        return fingerprint(self.version, hash_file(model_path), hash_array(tiler.pixels), tiler.grid_size)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        touch(path)
+        with np.load(path) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    def put(self, key, outputs):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = temp_path(path)
+        np.savez(tmp_path, **outputs)
+        os.replace(tmp_path, path)
+        evict_lru(self.cache_dir, max(self.max_bytes, os.path.getsize(path)), ".npz")
+
+    def outputs(self, model_path, tiler, batch_size=64):
+        """
+        The model's outputs for the patches of a bag (in row-major grid order), running the model only if they
+        aren't cached: features (N x F), aggregation, bag_pred and, if the aggregator gives it, attention.
+        """
+        key = self.key(model_path, tiler)
+        outputs = self.get(key)
+        if outputs is None:
+            logger.info("Running {:s} over {:d} patches".format(model_path, int(np.prod(tiler.grid_size))))
+            patches = np.stack([patch for row in tiler.patches() for patch in row])
+            outputs = run_model(model_path, patches, batch_size)
+            self.put(key, outputs)
+        return outputs
+
+
+inference_cache = InferenceCache()
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from manim import *
+
+from disk_cache import evict_lru, temp_path, touch
+
+
+class LabelCache:
+    """
+    Cache of MathTex labels keyed by text, scale and colour.
+    Built labels are kept in memory (least recently used are evicted first) and handed out as copies.
+    The point data of each label is also persisted to disk, so later runs don't need to compile LaTeX at all.
+    """
+
+    # Bump if the on-disk format changes
+    version = 1
+
+    def __init__(self, cache_dir=None, max_entries=256, max_disk_bytes=32 * 1024 * 1024):
+        self._cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._labels = OrderedDict()
+        self.reset_stats()
+
+    @property
+    def cache_dir(self):
+        # Resolved lazily so the cache follows any changes to the Manim config (e.g. --media_dir)
+        if self._cache_dir is None:
+            return os.path.join(config.media_dir, "label_cache")
+        return self._cache_dir
+
+    def reset_stats(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.cold_time = 0.0
+        self.warm_time = 0.0
+
+    def get(self, text, scale=1.0, colour=WHITE):
+        """
+        Get a copy of the label for the given text, scale and colour, building it only if it isn't cached.
+        """
+        start = time.perf_counter()
+        key = (text, float(scale), str(colour))
+        compiled = False
+        label = self._labels.get(key)
+        if label is not None:
+            self._labels.move_to_end(key)
+            self.hits += 1
+        else:
+            label = self._load(key, colour)
+            if label is not None:
+                self.disk_hits += 1
+            else:
+                label = MathTex(text).set_color(colour).scale(scale)
+                self._save(key, label)
+                self.misses += 1
+                compiled = True
+            self._labels[key] = label
+            while len(self._labels) > self.max_entries:
+                self._labels.popitem(last=False)
+        label = label.copy()
+        elapsed = time.perf_counter() - start
+        if compiled:
+            self.cold_time += elapsed
+        else:
+            self.warm_time += elapsed
+        return label
+
+    def report(self):
+        return "Label cache: {:d} memory hits, {:d} disk hits, {:d} LaTeX compiles " \
+               "(cold {:.2f}s, warm {:.2f}s)".format(self.hits, self.disk_hits, self.misses,
+                                                     self.cold_time, self.warm_time)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr((self.version, key)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".npz")
+
+    def _load(self, key, colour):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                points = [data["points_{:d}".format(idx)] for idx in range(len(data.files))]
+        except (OSError, ValueError, KeyError):
+            # Corrupt or partially written entry, so just rebuild it
+            return None
+        touch(path)
+        paths = [VMobject(color=colour, fill_opacity=1.0, stroke_width=0).set_points(p) for p in points]
+        return VGroup(*paths)
+
+    def _save(self, key, label):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        points = {"points_{:d}".format(idx): m.points for idx, m in enumerate(label.family_members_with_points())}
+        path = self._path(key)
+        tmp_path = temp_path(path)
+        np.savez(tmp_path, **points)
+        os.replace(tmp_path, path)
+        evict_lru(self.cache_dir, self.max_disk_bytes, ".npz")
+
+
+# Shared by all ArrayMobjects
+label_cache = LabelCache()
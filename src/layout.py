@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+from manim import DOWN, RIGHT
+
+
+def grid_layout(grid_size, max_height=5, max_width=8, max_cell_size=1):
+    """
+    Layout of the patch grid (the scene image), centred on the origin: the centre of every patch (R x C x 3)
+    and the patch size. Patches are max_cell_size squares unless that would make the grid bigger than the maximum size.
+    """
+    n_rows, n_cols = grid_size
+    cell_size = min(max_cell_size, max_height / n_rows, max_width / n_cols)
+    rows, cols = np.meshgrid(np.arange(n_rows) - (n_rows - 1) / 2, np.arange(n_cols) - (n_cols - 1) / 2,
+                             indexing="ij")
+    centres = (cols[..., None] * RIGHT + rows[..., None] * DOWN) * cell_size
+    return centres, cell_size
+
+
+class PipelineLayout:
+    """
+    Positions of every instance in each column of the pipeline (e.g. bag, features, predictions), computed at once.
+
+    Columns are placed left to right, centred at x=left for the first column, each as wide as given (e.g. the width of
+    its title) and buff apart from the previous column: columns is a list of (name, width, buff).
+    Instances go down every column from top, spacing apart. If the bag doesn't fit above bottom, the instances are
+    scaled down and, where it lets them be bigger, each column wraps into sub-columns (as many as fit its width).
+    All columns share the same rows, so an instance's slots line up across the columns.
+    """
+
+    def __init__(self, n_instances, columns, item_widths, left=-6, top=2.7, bottom=-3.3, spacing=0.7, gap=0.1):
+        self.n_instances = n_instances
+        self.spacing = spacing
+        self.gap = gap
+
+        self.names = [name for name, _, _ in columns]
+        widths = np.array([width for _, width, _ in columns], dtype=float)
+        buffs = np.array([buff for _, _, buff in columns], dtype=float)
+        # Width of each column's instances (columns that don't hold one per instance can leave it out)
+        items = np.array([item_widths.get(name, 0) for name in self.names], dtype=float)
+        # Each column is centred half its width past the previous column's right edge plus the buff
+        self.column_xs = left + np.concatenate([[0], np.cumsum((widths[:-1] + widths[1:]) / 2 + buffs[1:])])
+        # Room for a column's sub-columns: its width plus half the buff either side
+        rooms = widths + (buffs + np.append(buffs[1:], buffs[-1])) / 2
+
+        self.n_wraps, self.scale = self._fit(top - bottom, items, rooms, gap)
+        self.rows_per_wrap = math.ceil(n_instances / self.n_wraps)
+
+        # Every slot of every column at once: sub-columns are centred on their column, filled top to bottom
+        idx = np.arange(n_instances)
+        wraps = idx // self.rows_per_wrap - (self.n_wraps - 1) / 2
+        self.wrap_steps = (items + gap) * self.scale
+        self._slots = np.zeros((len(self.names), n_instances, 3))
+        self._slots[:, :, 0] = self.column_xs[:, None] + wraps[None, :] * self.wrap_steps[:, None]
+        self._slots[:, :, 1] = top - (idx % self.rows_per_wrap) * spacing * self.scale
+
+    def _fit(self, height, items, rooms, gap):
+        """
+        The number of sub-columns and the instance scale that make the instances as big as possible.
+        """
+        best = (1, min(1, height / (self.spacing * max(self.n_instances - 1, 1))))
+        for n_wraps in range(2, self.n_instances + 1):
+            if best[1] == 1:
+                break
+            rows = math.ceil(self.n_instances / n_wraps)
+            scale = min(1, height / (self.spacing * max(rows - 1, 1)))
+            if np.any((n_wraps * items + (n_wraps - 1) * gap) * scale > rooms):
+                break
+            if scale > best[1]:
+                best = (n_wraps, scale)
+        return best
+
+    def _column(self, name):
+        return self.names.index(name)
+
+    def column_x(self, name):
+        return self.column_xs[self._column(name)]
+
+    def slots(self, name):
+        """
+        Centre of every instance's slot in a column (N x 3).
+        """
+        return self._slots[self._column(name)]
+
+    def slot(self, name, idx):
+        return self._slots[self._column(name), idx]
+
+    def matrix_geometry(self, cell_size):
+        """
+        Spacing of a column's rows and sub-columns in units of its cells (cell_size across, before scaling),
+        for drawing the whole column as one BagMatrixMobject.
+        """
+        return {"row_pitch": self.spacing / cell_size, "n_wraps": self.n_wraps, "wrap_gap": self.gap / cell_size}
+
+    def column_middle(self, name):
+        """
+        Middle of the right-most sub-column of a column, e.g. for a stage that takes in the whole column.
+        """
+        col = self._column(name)
+        x = self.column_xs[col] + (self.n_wraps - 1) / 2 * self.wrap_steps[col]
+        y = self._slots[col, (min(self.rows_per_wrap, self.n_instances) - 1) // 2, 1]
+        return np.array([x, y, 0])
@@ -0,0 +1,51 @@
+"""
+Generate colourmap_luts.py: the built-in colour map lookup tables, so rendering doesn't need Matplotlib.
+This is the only place Matplotlib is required; the tables only need regenerating to add a colour map.
+
+Usage (from the src directory):
+
+`python make_colourmap_luts.py`
+"""
+import argparse
+import textwrap
+
+import matplotlib as mpl
+import numpy as np
+
+# Matplotlib's perceptually uniform sequential colour maps
+NAMES = ("viridis", "plasma", "inferno", "magma", "cividis")
+
+
+def lut_hex(name):
+    cmap = mpl.colormaps[name]
+    # Truncating (rather than rounding) to uint8 matches colouring with the Matplotlib colour map directly
+    lut = (np.asarray(cmap(np.arange(cmap.N)))[:, :3] * 255).astype(np.uint8)
+    return lut.tobytes().hex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="colourmap_luts.py")
+    parser.add_argument("names", nargs="*", default=NAMES)
+    args = parser.parse_args()
+
+    lines = [
+        '"""',
+        "Built-in colour map lookup tables: N x RGB uint8 entries, hex encoded (see colourmap.get_lut).",
+        "Generated by make_colourmap_luts.py (Matplotlib {:s}); don't edit by hand.".format(mpl.__version__),
+        '"""',
+        "",
+        "LUTS = {",
+    ]
+    for name in args.names:
+        lines.append('    "{:s}": ('.format(name))
+        for chunk in textwrap.wrap(lut_hex(name), 96):
+            lines.append('        "{:s}"'.format(chunk))
+        lines.append("    ),")
+    lines.append("}")
+    with open(args.output, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,99 @@
-import matplotlib as mpl
-import torch
+import numpy as np
 from manim import *
 
-from util import ShrinkToPoint, ArrayMobject, create_filter, calculate_angle
+from bags import Bag
+from colourmap import ArrayBatch
+from image_cache import PatchLoader
+from inference import inference_cache
+from layout import PipelineLayout, grid_layout
+from mil_scene import MILScene
+from util import (ShrinkToPoint, GrowFromPoint, FadeGhost, ArrayMobject, AimSweep, BagMatrixMobject, BagStage, ShiftBy,
+                  create_filter, ghost)
 
 
-class MILManim(Scene):
+class MILManim(MILScene):
 
-    def construct(self):
-        # Setup scene
-        self.camera.background_color = WHITE
-        cmap = mpl.cm.get_cmap('viridis')
+    sections = ("intro", "patching", "feature_extraction", "aggregation", "classification", "outputs")
+    # Predictions are (non-epithelial, epithelial)
+    bag = Bag("crc", patch_format="img/crc/crc_{row:d}_{col:d}.png", bag_pred=[0.1, 0.9])
+    # Length of the feature vectors shown
+    n_features = 7
 
+    def load_data(self):
+        n_rows, n_cols = self.grid_size
+        self.n_patches = n_rows * n_cols
+        # The patches are decoded in the background (see build_patches)
+        self.patch_loader = PatchLoader(self.bag, self.grid_size)
+
+        n_features = self.n_features
+        if self.bag.model is not None:
+            # Run the bag's model over the patches (batched, and cached on disk so later renders skip inference)
+            outputs = inference_cache.outputs(self.bag.model, self.tiler)
+            self.feature_vectors = outputs["features"][:, :n_features]
+            self.agg_values = outputs["aggregation"][:n_features].reshape(-1, 1)
+            self.pred_values = outputs["bag_pred"]
+            if self.pred_values.shape != (2,):
+                raise ValueError("Model {:s} needs to predict 2 classes, but gives a bag prediction of shape {:}"
+                                 .format(self.bag.model, self.pred_values.shape))
+            return
+
+        # Load the model outputs for the patches shown (random placeholders for any the bag doesn't have)
+        rng = np.random.RandomState(self.bag.seed)
+        self.feature_vectors = self.bag.instance_data("features", self.n_patches, n_features)
+        if self.feature_vectors is None:
+            self.feature_vectors = rng.rand(self.n_patches, n_features) * 2 - 1
+        attention = self.bag.instance_data("attention", self.n_patches)
+        if attention is None:
+            self.agg_values = rng.rand(n_features, 1) * 2 - 1
+        else:
+            # Attention-weighted mean of the features shown
+            weights = attention.ravel() / attention.sum()
+            self.agg_values = (weights @ self.feature_vectors).reshape(-1, 1)
+        self.pred_values = self.bag.bag_data("bag_pred")
+        if self.pred_values is None:
+            # Random placeholder prediction over the two classes
+            self.pred_values = rng.dirichlet(np.ones(2))
+        elif self.pred_values.shape != (2,):
+            raise ValueError("Bag {:s} needs a bag prediction of shape (2,)".format(self.bag.name))
+
+    def section_inputs(self, name):
+        return {
+            "patching": [self.tiler.pixels],
+            "feature_extraction": [self.feature_vectors],
+            "aggregation": [self.agg_values],
+            "classification": [self.pred_values],
+        }.get(name, [])
+
+    def build_mobjects(self):
+        cmap = "viridis"
+
+        # Lay out the grid of patches
+        self.grid_centres, self.cell_size = grid_layout(self.grid_size)
+        # Resampled while the intro plays, so the patches are ready by the time they're shown
+        self.patch_loader.prefetch(self.cell_size)
+
+        # Create aggregation and prediction arrays
+        self.agg_fv = ArrayMobject(self.agg_values, cmap, -1, 1).set_z_index(1)
+        self.pred_fv = ArrayMobject(self.pred_values, cmap, 0, 1).set_z_index(1)
+
+        # Column titles, and where every instance goes in each column
+        self.bag_text = Text("Bag", font_size=50, color=BLACK)
+        self.feature_text = Text("Features", font_size=50, color=BLACK)
+        self.agg_text = Text("Aggregation", font_size=50, color=BLACK)
+        self.pred_text = Text("Prediction", font_size=50, color=BLACK)
+        self.layout = PipelineLayout(
+            self.n_patches,
+            [("bag", self.bag_text.width, 0), ("features", self.feature_text.width, 0.5),
+             ("aggregation", self.agg_text.width, 0.5), ("prediction", self.pred_text.width, 0.5)],
+            {"bag": 0.6, "features": 0.4 * self.n_features},
+        )
+
+        # Features are rows of one matrix laid out like the features column (see feature_extraction)
+        feature_batch = ArrayBatch(self.feature_vectors, cmap, -1, 1)
+        self.feature_matrix = BagMatrixMobject.from_batch(feature_batch, **self.layout.matrix_geometry(0.4))
+        self.feature_matrix.scale(0.4 * self.layout.scale).set_z_index(1)
+
+    def intro(self):
         # Intro text
         intro_text_1 = Text("Multiple Instance Learning", font_size=50, color=BLACK).shift(UP)
         intro_text_2 = Text("Model Pipeline", font_size=50, color=BLACK).shift(DOWN)
@@ -24,46 +106,29 @@ class MILManim(Scene):
         )
         self.wait(1)
 
-        # Create grid of patches
-        grid_size = (3, 3)
-        n_patches = grid_size[0] * grid_size[1]
-        patches = np.empty(grid_size, dtype=object)
-        for col in range(grid_size[0]):
-            for row in range(grid_size[1]):
-                patch_path = "img/crc_{:d}_{:d}.png".format(row, col)
-                patch = ImageMobject(patch_path)
-                patch.height = patch.width = 1
-                patch.shift((col - 1) * RIGHT + (row - 1) * DOWN).set_z_index(1)
-                # self.play(Create(square))
-                patches[row][col] = patch
-        flat_patches = patches.ravel()
-
-        # Create random extracted features
-        n_features = 7
-        torch.random.manual_seed(0)
-        feature_vectors = torch.rand((n_patches, n_features)) * 2 - 1
-        agg_fv = torch.rand((n_features, 1)) * 2 - 1
-        features = []
-        for idx in range(n_patches):
-            features.append(ArrayMobject(feature_vectors[idx], cmap, -1, 1).create_mobject().set_z_index(1))
-        agg_fv = ArrayMobject(agg_fv, cmap, -1, 1).create_mobject().set_z_index(1)
-        pred_obj = ArrayMobject(torch.as_tensor([0.1, 0.9]), cmap, 0, 1)
-        pred_fv = pred_obj.create_mobject().set_z_index(1)
+    def patching(self):
+        self.build_patches()
+        patches = self.patches
+        n_rows, n_cols = self.grid_size
+        cell_size = self.cell_size
 
         # Add patches to scene to look like one image
         orig_img_text = Text("Original Image", font_size=50, color=BLACK).shift(UP * 2.5)
         self.play(Write(orig_img_text))
-        self.play(*[FadeIn(patch) for patch in flat_patches])
+        self.play(*[FadeIn(patch) for patch in self.flat_patches])
         self.wait(1)
         self.play(Unwrite(orig_img_text))
 
         # Create and add grid lines to divide patches
         lines = []
-        for col in range(grid_size[0] - 1):
-            line = Line((col - 0.5) * RIGHT - 1.55 * DOWN, (col - 0.5) * RIGHT + 1.55 * DOWN).set_z_index(2)
+        half_height, half_width = n_rows * cell_size / 2 + 0.05, n_cols * cell_size / 2 + 0.05
+        for col in range(n_cols - 1):
+            x = (col + 1 - n_cols / 2) * cell_size
+            line = Line(x * RIGHT - half_height * DOWN, x * RIGHT + half_height * DOWN).set_z_index(2)
             lines.append(line)
-        for row in range(grid_size[1] - 1):
-            line = Line(-1.55 * RIGHT + (row - 0.5) * DOWN, 1.55 * RIGHT + (row - 0.5) * DOWN).set_z_index(2)
+        for row in range(n_rows - 1):
+            y = (row + 1 - n_rows / 2) * cell_size
+            line = Line(-half_width * RIGHT + y * DOWN, half_width * RIGHT + y * DOWN).set_z_index(2)
             lines.append(line)
         self.play(*[Create(line) for line in lines])
         self.wait(1)
@@ -71,11 +136,10 @@ class MILManim(Scene):
         # Create and play animations to split image into patches
         patches_text = Text("Patches", font_size=50, color=BLACK).shift(UP * 2.5)
         split_anims = [Write(patches_text)]
-        for col in range(grid_size[0]):
-            for row in range(grid_size[1]):
+        for col in range(n_cols):
+            for row in range(n_rows):
                 square = patches[row][col]
-                new_loc = (0.2 * (col - 1) * RIGHT + 0.2 * (row - 1) * DOWN)
-                split_anims.append(square.animate.shift(new_loc))
+                split_anims.append(square.animate.shift(0.2 * self.grid_centres[row, col]))
         for line in lines:
             split_anims.append(FadeOut(line))
         self.play(*split_anims)
@@ -85,23 +149,26 @@ class MILManim(Scene):
 
         # Create and play animations to align patches in a column
         flatten_anims = []
-        for col in range(grid_size[0]):
-            for row in range(grid_size[1]):
-                patch = patches[row][col]
-                new_loc = 2.7 * UP + 6 * LEFT + (col * 0.7 + 2.1 * row) * DOWN
-                patch.generate_target()
-                patch.target.scale(0.6)
-                patch.target.move_to(new_loc)
-                flatten_anims.append(MoveToTarget(patch))
+        for patch, slot in zip(self.flat_patches, self.layout.slots("bag")):
+            patch.generate_target()
+            patch.target.height = 0.6 * self.layout.scale
+            patch.target.move_to(slot)
+            flatten_anims.append(MoveToTarget(patch))
         self.play(*flatten_anims)
         self.wait(1)
-        bag_text = Text("Bag", font_size=50, color=BLACK).shift(UP * 3.5 + 6 * LEFT)
-        self.play(Write(bag_text))
+        self.bag_text.move_to([self.layout.column_x("bag"), 3.5, 0])
+        self.play(Write(self.bag_text))
         self.wait(1)
 
+    def feature_extraction(self):
+        flat_patches = self.flat_patches
+        feature_matrix = self.feature_matrix
+        n_patches = self.n_patches
+        bag_slots = self.layout.slots("bag")
+
         # Create and add feature extractor
         fe_filter = create_filter(GREEN).scale(0.4)
-        fe_filter.set_z_index(2).move_to(flat_patches[0].get_center() + 1.5 * RIGHT).rotate(PI/2)
+        fe_filter.set_z_index(2).move_to(bag_slots[0] + 1.5 * RIGHT).rotate(PI/2)
         fe_text = Text("Feature \nExtractor", font_size=20, color=BLACK).shift(UP * 3.6 + 4.5 * LEFT)
         self.play(
             Write(fe_text),
@@ -110,30 +177,48 @@ class MILManim(Scene):
         self.wait(1)
 
         # Convert patches into features
-        feature_text = Text("Features", font_size=50, color=BLACK).shift(UP * 3.6 + 2.3 * LEFT)
-        patch_copies = [p.copy().set_z_index(0) for p in flat_patches]
-        for idx, patch in enumerate(flat_patches):
-            patch_copy = patch_copies[idx]
-            patch_copy.generate_target()
-            patch_copy.target.fade(0.5)
-            run_time = 1 if idx < 3 else 0.3
+        feature_text = self.feature_text.move_to(UP * 3.6 + 2.3 * LEFT)
+        self.patch_copies = patch_copies = [ghost(p).set_z_index(0) for p in flat_patches]
+        #  The first few patches are shown one by one, then the rest of the bag is processed in one go
+        stage = BagStage(n_patches)
+        #  The features start as hidden rows of the feature matrix, next to the bag. Those shown one by one (every
+        #  feature, unless the bag is big) are lifted out of the matrix, and the rest are revealed inside it
+        feature_matrix.set_row_opacity(range(n_patches), 0).move_row_to(0, bag_slots[0] + 2.2 * RIGHT)
+        self.add(feature_matrix)
+        lifted = range(n_patches) if stage.individual else stage.detailed
+        self.features = features = [feature_matrix.extract_row(idx) for idx in lifted]
+        for idx in stage.detailed:
+            patch = flat_patches[idx]
             self.play(
                 ShrinkToPoint(patch, fe_filter.get_center()),
-                MoveToTarget(patch_copy),
-                run_time=run_time
+                FadeGhost(patch_copies[idx]),
             )
-            features[idx].move_to(patch.get_center() + 2.2 * RIGHT).scale(0.4)
             self.play(
                 Indicate(fe_filter),
                 GrowFromPoint(features[idx], fe_filter.get_center() + 0.5 * RIGHT),
-                run_time=run_time
             )
             if idx == 0:
                 self.play(Write(feature_text))
-            if idx < len(flat_patches) - 1:
-                self.play(fe_filter.animate.move_to(flat_patches[idx + 1].get_center() + 1.5 * RIGHT),
-                          run_time=run_time)
+            if idx < n_patches - 1:
+                self.play(fe_filter.animate.move_to(bag_slots[idx + 1] + 1.5 * RIGHT))
             self.remove(patch)
+        if stage.batched:
+            #  The filter sweeps down the rest of the bag, and each patch is converted as the filter passes it
+            batch_anims = []
+            for idx in stage.batched:
+                patch = flat_patches[idx]
+                filter_point = bag_slots[idx] + 1.5 * RIGHT
+                anims = [ShrinkToPoint(patch, filter_point), FadeGhost(patch_copies[idx])]
+                if stage.individual:
+                    anims.append(GrowFromPoint(features[idx], filter_point + 0.5 * RIGHT))
+                batch_anims.append(anims)
+            self.play(
+                stage.batch_animation(batch_anims),
+                stage.fade_rows(feature_matrix, range(len(features), n_patches), 1),
+                fe_filter.animate(rate_func=linear).move_to(bag_slots[-1] + 1.5 * RIGHT),
+                run_time=stage.batch_time,
+            )
+            self.remove(*[flat_patches[idx] for idx in stage.batched])
         self.wait(1)
 
         # Shift features left
@@ -142,17 +227,28 @@ class MILManim(Scene):
             Unwrite(fe_text),
         )
         feature_text.generate_target()
-        feature_text.target.next_to(bag_text, buff=0.5).shift(UP * 0.07)
+        feature_text.target.move_to([self.layout.column_x("features"), self.bag_text.get_y() + 0.07, 0])
+        offset = self.layout.slot("features", 0) - feature_matrix.row_center(0)
         self.play(
             MoveToTarget(feature_text),
-            *[f.animate.move_to([feature_text.target.get_x(), f.get_y(), 0]) for f in features],
+            ShiftBy(feature_matrix, offset),
+            *[ShiftBy(f, offset) for f in features],
         )
+        # The bag's faded patches and the titles won't move again
+        self.flatten(*patch_copies, self.bag_text, feature_text)
         self.wait(1)
 
+    def aggregation(self):
+        features = self.features
+        feature_matrix = self.feature_matrix
+        n_patches = self.n_patches
+        agg_fv = self.agg_fv
+
         # Create and add aggregator
         agg_filter = create_filter(BLUE).scale(0.4)
-        agg_filter.set_z_index(2).move_to(features[4].get_center() + 2.3 * RIGHT).rotate(PI/2)
-        aggregator_text = Text("Aggregator", font_size=20, color=BLACK).next_to(feature_text, buff=0.2).shift(DOWN * 0.1)
+        agg_filter.set_z_index(2).move_to(self.layout.column_middle("features") + 2.3 * RIGHT).rotate(PI/2)
+        aggregator_text = Text("Aggregator", font_size=20, color=BLACK).next_to(self.feature_text, buff=0.2)\
+            .shift(DOWN * 0.1)
         self.play(
             Write(aggregator_text),
             Create(agg_filter),
@@ -160,38 +256,23 @@ class MILManim(Scene):
         self.wait(1)
 
         # Aggregate features
-        #  Here we track the current rotation of the aggregator and rotate it by the difference between its current
-        #   rotation and the new target rotation, as Manim rotation is relative rather than absolute
-        feature_copies = [f.copy().set_z_index(0) for f in features]
-        current_rotation = calculate_angle(agg_filter, features[0]) - PI
-        self.play(agg_filter.animate.rotate(current_rotation, about_point=agg_filter.get_center_of_mass()))
-        for idx, feature in enumerate(features):
-            run_time = 1 if idx < 3 else 0.3
-            feature_copy = feature_copies[idx]
-            feature_copy.generate_target()
-            feature_copy.target.fade(0.5)
-            self.play(
-                ShrinkToPoint(feature, agg_filter.get_center()),
-                MoveToTarget(feature_copy),
-                run_time=run_time,
-            )
-            if idx < len(flat_patches) - 1:
-                # Quick fix to alignment of middle patch as it doesn't quick align properly normally (rounding error?)
-                new_rotation = 0 if idx == 3 else calculate_angle(agg_filter, features[idx + 1]) - PI
-                self.play(
-                    agg_filter.animate.rotate(new_rotation - current_rotation,
-                                              about_point=agg_filter.get_center_of_mass()),
-                    run_time=run_time,
-                )
-                current_rotation = new_rotation
-            self.remove(feature)
-        self.wait(1)
-        self.play(agg_filter.animate.rotate(-current_rotation,
-                                            about_point=agg_filter.get_center_of_mass()))
+        #  The aggregator sweeps over the features, taking each one in as it points at it, and then turns back
+        #  Features lifted out of the matrix shrink into it and leave a ghost behind, the rest fade inside the matrix
+        self.feature_copies = feature_copies = [ghost(f).set_z_index(0) for f in features]
+        sweep = AimSweep(agg_filter, self.layout.slots("features"), run_time=min(n_patches + 1, 10))
+        self.play(
+            sweep,
+            sweep.take_in([
+                [ShrinkToPoint(feature, agg_filter.get_center()), FadeGhost(feature_copy)]
+                for feature, feature_copy in zip(features, feature_copies)
+            ]),
+            sweep.fade_rows(feature_matrix, range(len(features), n_patches), 0.5),
+        )
+        self.remove(*features)
         self.wait(1)
 
         # Create bag aggregation
-        agg_text = Text("Aggregation", font_size=50, color=BLACK).next_to(aggregator_text, buff=0.2).shift(UP * 0.06)
+        agg_text = self.agg_text.next_to(aggregator_text, buff=0.2).shift(UP * 0.06)
         agg_fv.move_to([agg_text.get_x(), agg_filter.get_y(), 0]).scale(0.5)
         self.play(
             Indicate(agg_filter),
@@ -206,17 +287,22 @@ class MILManim(Scene):
             Unwrite(aggregator_text),
         )
         agg_text.generate_target()
-        agg_text.target.next_to(feature_text, buff=0.5).shift(DOWN * 0.05)
+        agg_text.target.move_to([self.layout.column_x("aggregation"), self.feature_text.get_y() - 0.05, 0])
         self.play(
             MoveToTarget(agg_text),
             agg_fv.animate.move_to([agg_text.target.get_x(), agg_fv.get_y(), 0]),
         )
+        self.flatten(*feature_copies, feature_matrix, agg_text)
         self.wait(1)
 
+    def classification(self):
+        agg_fv = self.agg_fv
+        pred_fv = self.pred_fv
+
         # Create classifier
         clz_filter = create_filter(RED).scale(0.4)
         clz_filter.set_z_index(2).next_to(agg_fv, buff=0.5).rotate(PI / 2)
-        clz_text = Text("Classifier", font_size=20, color=BLACK).next_to(agg_text, buff=0.2)
+        clz_text = Text("Classifier", font_size=20, color=BLACK).next_to(self.agg_text, buff=0.2)
         self.play(
             Write(clz_text),
             Create(clz_filter),
@@ -224,15 +310,13 @@ class MILManim(Scene):
         self.wait(1)
 
         # Run classification
-        agg_fv_copy = agg_fv.copy().set_z_index(0)
-        agg_fv_copy.generate_target()
-        agg_fv_copy.target.fade(0.5)
+        self.agg_fv_copy = agg_fv_copy = ghost(agg_fv).set_z_index(0)
         self.play(
             ShrinkToPoint(agg_fv, clz_filter.get_center()),
-            MoveToTarget(agg_fv_copy),
+            FadeGhost(agg_fv_copy),
         )
         self.wait(1)
-        pred_text = Text("Prediction", font_size=50, color=BLACK).next_to(clz_text, buff=0.2).shift(UP * 0.06)
+        pred_text = self.pred_text.next_to(clz_text, buff=0.2).shift(UP * 0.06)
         pred_fv.move_to([pred_text.get_x(), clz_filter.get_y(), 0]).scale(0.7)
         self.play(
             Indicate(clz_filter),
@@ -247,17 +331,21 @@ class MILManim(Scene):
             Unwrite(clz_text),
         )
         pred_text.generate_target()
-        pred_text.target.next_to(agg_text, buff=0.5).shift(UP * 0.05)
+        pred_text.target.move_to([self.layout.column_x("prediction"), self.agg_text.get_y() + 0.05, 0])
         self.play(
             MoveToTarget(pred_text),
             pred_fv.animate.move_to([pred_text.target.get_x(), pred_fv.get_y(), 0]),
         )
+        self.flatten(agg_fv_copy, pred_text)
         self.wait(1)
 
+    def outputs(self):
+        pred_fv = self.pred_fv
+
         # Show final outputs
-        splits = pred_obj.create_splits()
-        splits[0].move_to(pred_fv.get_center() + pred_fv.width/4 * LEFT).scale(0.7).set_z_index(2)
-        splits[1].move_to(pred_fv.get_center() + pred_fv.width/4 * RIGHT).scale(0.7).set_z_index(2)
+        splits = pred_fv.split_cells()
+        splits[0].set_z_index(2)
+        splits[1].set_z_index(2)
         self.add(splits[0])
         self.add(splits[1])
         self.remove(pred_fv)
@@ -281,16 +369,17 @@ class MILManim(Scene):
 
         # Fade all out
         self.play(
-            *[FadeOut(p) for p in patch_copies],
-            *[FadeOut(f) for f in feature_copies],
-            FadeOut(agg_fv_copy),
+            *[FadeOut(p) for p in self.patch_copies],
+            *[FadeOut(f) for f in self.feature_copies],
+            FadeOut(self.feature_matrix),
+            FadeOut(self.agg_fv_copy),
             FadeOut(pred_0_text),
             FadeOut(pred_1_text),
             FadeOut(splits[0]),
             FadeOut(splits[1]),
-            FadeOut(bag_text),
-            FadeOut(feature_text),
-            FadeOut(agg_text),
-            FadeOut(pred_text),
+            FadeOut(self.bag_text),
+            FadeOut(self.feature_text),
+            FadeOut(self.agg_text),
+            FadeOut(self.pred_text),
         )
         self.wait(1)
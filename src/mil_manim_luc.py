@@ -1,41 +1,27 @@
-import matplotlib as mpl
 import numpy as np
 from manim import *
 
-from util import ShrinkToPoint, ArrayMobject, create_filter, calculate_angle
-
-
-class MILManimLUC(Scene):
-
-    def construct(self):
-        # Setup scene
-        self.camera.background_color = WHITE
-        cmap = mpl.cm.get_cmap('viridis')
-
-        # Setup grid of patches (no animation)
-        grid_size = (3, 3)
-        n_patches = grid_size[0] * grid_size[1]
-        patches = np.empty(grid_size, dtype=object)
-        for col in range(grid_size[0]):
-            for row in range(grid_size[1]):
-                patch_path = "img/lcc/dg_lcc_{:d}_{:d}.png".format(row, col)
-                patch = ImageMobject(patch_path)
-                patch.height = patch.width = 1
-                patch.shift((col - 1) * RIGHT + (row - 1) * DOWN).set_z_index(1)
-                patches[row][col] = patch
-        flat_patches = patches.ravel()
-
-        # Setup random feature vectors
-        n_features = 7
-        np.random.seed(0)
-        feature_vectors = np.random.rand(n_patches, n_features) * 2 - 1
-        features = []
-        for idx in range(n_patches):
-            features.append(ArrayMobject(feature_vectors[idx], cmap, 0, 1).create_mobject().set_z_index(1))
+from bags import Bag
+from colourmap import ArrayBatch
+from image_cache import PatchLoader, patch_cache
+from layout import PipelineLayout, grid_layout
+from mil_scene import MILScene
+from util import (ShrinkToPoint, GrowFromPoint, GrowFromCenter, FadeGhost, FadeRows, ArrayMobject, BagMatrixMobject,
+                  BagStage, PredictionMask, RevealMask, ShiftBy, create_filter, ghost)
 
-        # Setup instance and bag predictions
-        #   urban_land, agriculture_land, rangeland, forest_land, water, barren_land, unknown
-        instance_preds = [
+
+class MILManimLUC(MILScene):
+
+    sections = ("intro", "patching", "feature_extraction", "classification", "aggregation", "outputs")
+    class_names = ["Urban", "Agricultural", "Rangeland", "Forest", "Water", "Barren", "Unknown"]
+    # (mask, legend text) colour of each class
+    class_colours = [(BLUE, BLUE), (YELLOW, YELLOW_E), (ORANGE, ORANGE), (GREEN, GREEN), (TEAL, TEAL),
+                     (GREY_BROWN, GREY_BROWN), (GREY, GREY)]
+    bag = Bag(
+        "lcc",
+        image="img/lcc/sat_img.jpg",
+        # Predictions are (urban_land, agriculture_land, rangeland, forest_land, water, barren_land, unknown)
+        instance_preds=[
             [0.1, 0.9, 0.0, 0.0, 0.0, 0.0, 0.0],
             [0.1, 0.7, 0.1, 0.0, 0.0, 0.1, 0.0],
             [0.0, 0.8, 0.1, 0.0, 0.0, 0.1, 0.0],
@@ -45,15 +31,84 @@ class MILManimLUC(Scene):
             [0.1, 0.7, 0.2, 0.0, 0.0, 0.0, 0.0],
             [0.6, 0.3, 0.1, 0.0, 0.0, 0.0, 0.0],
             [0.0, 0.3, 0.1, 0.6, 0.0, 0.0, 0.0],
-        ]
-        instance_preds = np.asarray(instance_preds)
-        instance_pred_objs = []
-        for idx in range(n_patches):
-            instance_pred_objs.append(ArrayMobject(instance_preds[idx], cmap, -1, 1).create_mobject().set_z_index(1))
-        bag_pred = np.mean(instance_preds, axis=0)
-        bag_pred_obj = ArrayMobject(bag_pred, cmap, 0, 1)
-        bag_pred_obj = bag_pred_obj.create_mobject().set_z_index(1)
+        ],
+        label=[0.14, 0.65, 0.14, 0.05, 0.0, 0.02, 0.0],
+    )
+    # Length of the feature vectors shown
+    n_features = 7
+
+    def load_data(self):
+        n_rows, n_cols = self.grid_size
+        self.n_patches = n_rows * n_cols
+        # The patches are decoded in the background (see build_patches)
+        self.patch_loader = PatchLoader(self.bag, self.grid_size)
+
+        # Load the model outputs for the patches shown (random placeholder features if the bag doesn't have them)
+        n_features = self.n_features
+        self.feature_vectors = self.bag.instance_data("features", self.n_patches, n_features)
+        if self.feature_vectors is None:
+            self.feature_vectors = np.random.RandomState(self.bag.seed).rand(self.n_patches, n_features) * 2 - 1
+
+        # Setup instance and bag predictions
+        #   The bag prediction defaults to the (attention-weighted, if given) mean of the instance predictions shown
+        self.instance_preds = self.bag.instance_data("instance_preds", self.n_patches)
+        expected_shape = (self.n_patches, len(self.class_names))
+        if self.instance_preds is None or self.instance_preds.shape != expected_shape:
+            raise ValueError("Bag {:s} needs instance predictions of shape {:}".format(self.bag.name, expected_shape))
+        self.bag_pred = self.bag.bag_data("bag_pred")
+        if self.bag_pred is None:
+            attention = self.bag.instance_data("attention", self.n_patches)
+            weights = None if attention is None else attention.ravel()
+            self.bag_pred = np.average(self.instance_preds, axis=0, weights=weights)
+
+    def section_inputs(self, name):
+        return {
+            # Colours as hex strings (they're ManimColor objects in newer versions of Manim)
+            "patching": [self.tiler.pixels, self.bag.label, self.class_names,
+                         [[str(c) for c in colours] for colours in self.class_colours]],
+            "feature_extraction": [self.feature_vectors],
+            "classification": [self.instance_preds],
+            "aggregation": [self.bag_pred],
+            "outputs": [self.instance_preds],
+        }.get(name, [])
+
+    def build_mobjects(self):
+        cmap = "viridis"
+
+        # Lay out the grid of patches
+        self.grid_centres, self.cell_size = grid_layout(self.grid_size)
+        # Resampled while the intro plays, so the patches are ready by the time they're shown
+        self.patch_loader.prefetch(self.cell_size)
+
+        # Setup bag prediction
+        self.bag_pred_obj = ArrayMobject(self.bag_pred, cmap, 0, 1).set_z_index(1)
+
+        # Column titles, and where every instance goes in each column
+        self.bag_text = Text("Bag", font_size=50, color=BLACK)
+        self.feature_text = Text("Features", font_size=50, color=BLACK)
+        self.instance_preds_text = Text("  Instance  \nPredictions", font_size=28, color=BLACK)
+        self.bag_pred_text = Text("     Bag     \nPrediction", font_size=28, color=BLACK)
+        self.layout = PipelineLayout(
+            self.n_patches,
+            [("bag", self.bag_text.width, 0), ("features", self.feature_text.width, 0.5),
+             ("instance_preds", self.instance_preds_text.width, 1.2), ("bag_pred", self.bag_pred_text.width, 2.2)],
+            {"bag": 0.6, "features": 0.4 * self.n_features, "instance_preds": 0.4 * len(self.class_names)},
+        )
+
+        # Features and instance predictions are rows of matrices laid out like their columns
+        #  (see feature_extraction and classification)
+        geometry = self.layout.matrix_geometry(0.4)
+        feature_batch = ArrayBatch(self.feature_vectors, cmap, 0, 1)
+        self.feature_matrix = BagMatrixMobject.from_batch(feature_batch, **geometry)
+        self.feature_matrix.scale(0.4 * self.layout.scale).set_z_index(1)
+        instance_pred_batch = ArrayBatch(self.instance_preds, cmap, -1, 1)
+        self.instance_pred_matrix = BagMatrixMobject.from_batch(instance_pred_batch, **geometry)
+        self.instance_pred_matrix.scale(0.4 * self.layout.scale).set_z_index(1)
 
+    def class_proportions_text(self, proportions):
+        return "\n".join("{:s}: {:.0f}%".format(name, p * 100) for name, p in zip(self.class_names, proportions))
+
+    def intro(self):
         # Intro text
         intro_text_1 = Text("Multiple Instance Learning", font_size=50, color=BLACK).shift(UP)
         intro_text_2 = Text("Land Cover Classification", font_size=50, color=BLACK)
@@ -69,33 +124,40 @@ class MILManimLUC(Scene):
         )
         self.wait(1)
 
+    def patching(self):
+        self.build_patches()
+        patches = self.patches
+        n_rows, n_cols = self.grid_size
+        cell_size = self.cell_size
+
         # Add patches to scene to look like one image
         orig_img_text = Text("Scene Image", font_size=50, color=BLACK).shift(UP * 2.5)
         self.play(Write(orig_img_text))
-        self.play(*[FadeIn(patch) for patch in flat_patches])
+        self.play(*[FadeIn(patch) for patch in self.flat_patches])
         self.wait(1)
-        orig_img_label_text = Text("Urban: 14% \n"
-                                   "Agricultural: 65% \n"
-                                   "Rangeland: 14% \n"
-                                   "Forest: 5%\n"
-                                   "Water: 0% \n"
-                                   "Barren: 2%\n"
-                                   "Unknown: 0%",
-                                   font_size=25, color=BLACK, slant=ITALIC).shift(RIGHT * 3.2)
-        self.play(Write(orig_img_label_text), run_time=3)
-        self.wait(5)
-        self.play(
-            Unwrite(orig_img_text),
-            Unwrite(orig_img_label_text),
-        )
+        if self.bag.label is not None:
+            orig_img_label_text = Text(self.class_proportions_text(self.bag.label),
+                                       font_size=25, color=BLACK, slant=ITALIC).shift(RIGHT * 3.2)
+            self.play(Write(orig_img_label_text), run_time=3)
+            self.wait(5)
+            self.play(
+                Unwrite(orig_img_text),
+                Unwrite(orig_img_label_text),
+            )
+        else:
+            self.wait(2)
+            self.play(Unwrite(orig_img_text))
 
         # Create and add grid lines to divide patches
         lines = []
-        for col in range(grid_size[0] - 1):
-            line = Line((col - 0.5) * RIGHT - 1.55 * DOWN, (col - 0.5) * RIGHT + 1.55 * DOWN).set_z_index(2)
+        half_height, half_width = n_rows * cell_size / 2 + 0.05, n_cols * cell_size / 2 + 0.05
+        for col in range(n_cols - 1):
+            x = (col + 1 - n_cols / 2) * cell_size
+            line = Line(x * RIGHT - half_height * DOWN, x * RIGHT + half_height * DOWN).set_z_index(2)
             lines.append(line)
-        for row in range(grid_size[1] - 1):
-            line = Line(-1.55 * RIGHT + (row - 0.5) * DOWN, 1.55 * RIGHT + (row - 0.5) * DOWN).set_z_index(2)
+        for row in range(n_rows - 1):
+            y = (row + 1 - n_rows / 2) * cell_size
+            line = Line(-half_width * RIGHT + y * DOWN, half_width * RIGHT + y * DOWN).set_z_index(2)
             lines.append(line)
         self.play(*[Create(line) for line in lines])
         self.wait(1)
@@ -103,11 +165,10 @@ class MILManimLUC(Scene):
         # Create and play animations to split image into patches
         patches_text = Text("Patches", font_size=50, color=BLACK).shift(UP * 2.5)
         split_anims = [Write(patches_text)]
-        for col in range(grid_size[0]):
-            for row in range(grid_size[1]):
+        for col in range(n_cols):
+            for row in range(n_rows):
                 square = patches[row][col]
-                new_loc = (0.2 * (col - 1) * RIGHT + 0.2 * (row - 1) * DOWN)
-                split_anims.append(square.animate.shift(new_loc))
+                split_anims.append(square.animate.shift(0.2 * self.grid_centres[row, col]))
         for line in lines:
             split_anims.append(FadeOut(line))
         self.play(*split_anims)
@@ -117,23 +178,26 @@ class MILManimLUC(Scene):
 
         # Create and play animations to align patches in a column
         flatten_anims = []
-        for col in range(grid_size[0]):
-            for row in range(grid_size[1]):
-                patch = patches[row][col]
-                new_loc = 2.7 * UP + 6 * LEFT + (col * 0.7 + 2.1 * row) * DOWN
-                patch.generate_target()
-                patch.target.scale(0.6)
-                patch.target.move_to(new_loc)
-                flatten_anims.append(MoveToTarget(patch))
+        for patch, slot in zip(self.flat_patches, self.layout.slots("bag")):
+            patch.generate_target()
+            patch.target.height = 0.6 * self.layout.scale
+            patch.target.move_to(slot)
+            flatten_anims.append(MoveToTarget(patch))
         self.play(*flatten_anims)
         self.wait(1)
-        bag_text = Text("Bag", font_size=50, color=BLACK).shift(UP * 3.5 + 6 * LEFT)
-        self.play(Write(bag_text))
+        self.bag_text.move_to([self.layout.column_x("bag"), 3.5, 0])
+        self.play(Write(self.bag_text))
         self.wait(1)
 
+    def feature_extraction(self):
+        flat_patches = self.flat_patches
+        feature_matrix = self.feature_matrix
+        n_patches = self.n_patches
+        bag_slots = self.layout.slots("bag")
+
         # Create and add feature extractor
         fe_filter = create_filter(GREEN).scale(0.4)
-        fe_filter.set_z_index(2).move_to(flat_patches[0].get_center() + 1.5 * RIGHT).rotate(PI/2)
+        fe_filter.set_z_index(2).move_to(bag_slots[0] + 1.5 * RIGHT).rotate(PI/2)
         fe_text = Text("   Feature   \nExtractor", font_size=20, color=BLACK).shift(UP * 3.6 + 4.5 * LEFT)
         self.play(
             Write(fe_text),
@@ -142,30 +206,48 @@ class MILManimLUC(Scene):
         self.wait(1)
 
         # Convert patches into features
-        feature_text = Text("Features", font_size=50, color=BLACK).shift(UP * 3.6 + 2.3 * LEFT)
-        patch_copies = [p.copy().set_z_index(0) for p in flat_patches]
-        for idx, patch in enumerate(flat_patches):
-            patch_copy = patch_copies[idx]
-            patch_copy.generate_target()
-            patch_copy.target.fade(0.5)
-            run_time = 1 if idx < 3 else 0.3
+        feature_text = self.feature_text.move_to(UP * 3.6 + 2.3 * LEFT)
+        self.patch_copies = patch_copies = [ghost(p).set_z_index(0) for p in flat_patches]
+        #  The first few patches are shown one by one, then the rest of the bag is processed in one go
+        stage = BagStage(n_patches)
+        #  The features start as hidden rows of the feature matrix, next to the bag. Those shown one by one (every
+        #  feature, unless the bag is big) are lifted out of the matrix, and the rest are revealed inside it
+        feature_matrix.set_row_opacity(range(n_patches), 0).move_row_to(0, bag_slots[0] + 2.2 * RIGHT)
+        self.add(feature_matrix)
+        lifted = range(n_patches) if stage.individual else stage.detailed
+        self.features = features = [feature_matrix.extract_row(idx) for idx in lifted]
+        for idx in stage.detailed:
+            patch = flat_patches[idx]
             self.play(
                 ShrinkToPoint(patch, fe_filter.get_center()),
-                MoveToTarget(patch_copy),
-                run_time=run_time
+                FadeGhost(patch_copies[idx]),
             )
-            features[idx].move_to(patch.get_center() + 2.2 * RIGHT).scale(0.4)
             self.play(
                 Indicate(fe_filter),
                 GrowFromPoint(features[idx], fe_filter.get_center() + 0.5 * RIGHT),
-                run_time=run_time
             )
             if idx == 0:
                 self.play(Write(feature_text))
-            if idx < len(flat_patches) - 1:
-                self.play(fe_filter.animate.move_to(flat_patches[idx + 1].get_center() + 1.5 * RIGHT),
-                          run_time=run_time)
+            if idx < n_patches - 1:
+                self.play(fe_filter.animate.move_to(bag_slots[idx + 1] + 1.5 * RIGHT))
             self.remove(patch)
+        if stage.batched:
+            #  The filter sweeps down the rest of the bag, and each patch is converted as the filter passes it
+            batch_anims = []
+            for idx in stage.batched:
+                patch = flat_patches[idx]
+                filter_point = bag_slots[idx] + 1.5 * RIGHT
+                anims = [ShrinkToPoint(patch, filter_point), FadeGhost(patch_copies[idx])]
+                if stage.individual:
+                    anims.append(GrowFromPoint(features[idx], filter_point + 0.5 * RIGHT))
+                batch_anims.append(anims)
+            self.play(
+                stage.batch_animation(batch_anims),
+                stage.fade_rows(feature_matrix, range(len(features), n_patches), 1),
+                fe_filter.animate(rate_func=linear).move_to(bag_slots[-1] + 1.5 * RIGHT),
+                run_time=stage.batch_time,
+            )
+            self.remove(*[flat_patches[idx] for idx in stage.batched])
         self.wait(1)
 
         # Shift features left
@@ -174,16 +256,27 @@ class MILManimLUC(Scene):
             Unwrite(fe_text),
         )
         feature_text.generate_target()
-        feature_text.target.next_to(bag_text, buff=0.5).shift(UP * 0.07)
+        feature_text.target.move_to([self.layout.column_x("features"), self.bag_text.get_y() + 0.07, 0])
+        offset = self.layout.slot("features", 0) - feature_matrix.row_center(0)
         self.play(
             MoveToTarget(feature_text),
-            *[f.animate.move_to([feature_text.target.get_x(), f.get_y(), 0]) for f in features],
+            ShiftBy(feature_matrix, offset),
+            *[ShiftBy(f, offset) for f in features],
         )
+        # The bag's faded patches and the titles won't move again
+        self.flatten(*patch_copies, self.bag_text, feature_text)
         self.wait(1)
 
+    def classification(self):
+        features = self.features
+        feature_matrix = self.feature_matrix
+        instance_pred_matrix = self.instance_pred_matrix
+        n_patches = self.n_patches
+        feature_slots = self.layout.slots("features")
+
         # Create and add classifier
         clz_filter = create_filter(RED).scale(0.4)
-        clz_filter.set_z_index(2).move_to(features[0].get_center() + 2.3 * RIGHT).rotate(PI/2)
+        clz_filter.set_z_index(2).move_to(feature_slots[0] + 2.3 * RIGHT).rotate(PI/2)
         clz_text = Text("  Instance  \nClassifier", font_size=20, color=BLACK).shift(UP * 3.6 + 1.3 * LEFT)
 
         self.play(
@@ -193,31 +286,50 @@ class MILManimLUC(Scene):
         self.wait(1)
 
         # Classify patches
-        feature_copies = [f.copy().set_z_index(0) for f in features]
-        instance_preds_text = Text("  Instance  \nPredictions",
-                                   font_size=28, color=BLACK).next_to(clz_text, buff=0.6).shift(DOWN * 0.1)
-        for idx, feature in enumerate(features):
-            feature_copy = feature_copies[idx]
-            feature_copy.generate_target()
-            feature_copy.target.fade(0.5)
-            run_time = 1 if idx < 3 else 0.3
+        self.feature_copies = feature_copies = [ghost(f).set_z_index(0) for f in features]
+        instance_preds_text = self.instance_preds_text.next_to(clz_text, buff=0.6).shift(DOWN * 0.1)
+        stage = BagStage(n_patches)
+        #  As with the features, the instance predictions start as hidden rows of a matrix, next to the features
+        instance_pred_matrix.set_row_opacity(range(n_patches), 0).move_row_to(0, feature_slots[0] + 2.2 * RIGHT)
+        self.add(instance_pred_matrix)
+        lifted = range(n_patches) if stage.individual else stage.detailed
+        self.instance_pred_objs = instance_pred_objs = [instance_pred_matrix.extract_row(idx) for idx in lifted]
+        for idx in stage.detailed:
+            feature = features[idx]
             self.play(
                 ShrinkToPoint(feature, clz_filter.get_center()),
-                MoveToTarget(feature_copy),
-                run_time=run_time
+                FadeGhost(feature_copies[idx]),
             )
-            instance_pred_objs[idx].move_to(feature.get_center() + 2.2 * RIGHT).scale(0.4)
             self.play(
-                Indicate(fe_filter),
+                Indicate(clz_filter),
                 GrowFromPoint(instance_pred_objs[idx], clz_filter.get_center() + 0.5 * RIGHT),
-                run_time=run_time
             )
             if idx == 0:
                 self.play(Write(instance_preds_text))
-            if idx < len(features) - 1:
-                self.play(clz_filter.animate.move_to(features[idx + 1].get_center() + 2.3 * RIGHT),
-                          run_time=run_time)
+            if idx < n_patches - 1:
+                self.play(clz_filter.animate.move_to(feature_slots[idx + 1] + 2.3 * RIGHT))
             self.remove(feature)
+        if stage.batched:
+            #  The classifier sweeps down the rest of the features, classifying each one as it passes
+            #  (in a big bag, the features fade inside their matrix and the predictions are revealed inside theirs)
+            rest = range(len(features), n_patches)
+            anims = [
+                stage.fade_rows(feature_matrix, rest, 0.5),
+                stage.fade_rows(instance_pred_matrix, rest, 1),
+                clz_filter.animate(rate_func=linear).move_to(feature_slots[-1] + 2.3 * RIGHT),
+            ]
+            if stage.individual:
+                batch_anims = []
+                for idx in stage.batched:
+                    filter_point = feature_slots[idx] + 2.3 * RIGHT
+                    batch_anims.append([
+                        ShrinkToPoint(features[idx], filter_point),
+                        FadeGhost(feature_copies[idx]),
+                        GrowFromPoint(instance_pred_objs[idx], filter_point + 0.5 * RIGHT),
+                    ])
+                anims.append(stage.batch_animation(batch_anims))
+            self.play(*anims, run_time=stage.batch_time)
+            self.remove(*features[stage.batched.start:])
         self.wait(1)
 
         # Shift instance predictions left
@@ -226,79 +338,80 @@ class MILManimLUC(Scene):
             Unwrite(clz_text),
         )
         instance_preds_text.generate_target()
-        instance_preds_text.target.next_to(feature_text, buff=1.2).shift(DOWN * 0.07)
+        instance_preds_text.target.move_to([self.layout.column_x("instance_preds"),
+                                            self.feature_text.get_y() - 0.07, 0])
+        offset = self.layout.slot("instance_preds", 0) - instance_pred_matrix.row_center(0)
         self.play(
             MoveToTarget(instance_preds_text),
-            *[o.animate.move_to([instance_preds_text.target.get_x(), o.get_y(), 0]) for o in instance_pred_objs],
+            ShiftBy(instance_pred_matrix, offset),
+            *[ShiftBy(o, offset) for o in instance_pred_objs],
         )
+        self.flatten(*feature_copies, feature_matrix, instance_preds_text)
         self.wait(1)
 
+    def aggregation(self):
+        instance_pred_objs = self.instance_pred_objs
+        instance_pred_matrix = self.instance_pred_matrix
+        bag_pred_obj = self.bag_pred_obj
+
         # Merge instance predictions into bag prediction
-        instance_pred_obj_copies = [o.copy().set_z_index(0) for o in instance_pred_objs]
-        bag_pred_text = Text("     Bag     \nPrediction",
-                             font_size=28, color=BLACK).next_to(instance_preds_text, buff=2.2)#.shift(DOWN * 0.1)
-        bag_pred_obj.move_to(instance_pred_objs[0].get_center() + 4 * RIGHT).scale(0.4)
-        for idx in range(len(instance_pred_objs)):
-            instance_pred_obj_copies[idx].generate_target()
-            instance_pred_obj_copies[idx].target.fade(0.5)
+        #  Lifted out predictions shrink into it and leave a ghost behind, the rest fade inside their matrix
+        instance_pred_obj_copies = [ghost(o).set_z_index(0) for o in instance_pred_objs]
+        bag_pred_text = self.bag_pred_text.move_to([self.layout.column_x("bag_pred"),
+                                                    self.instance_preds_text.get_y(), 0])
+        bag_pred_obj.move_to(self.layout.slot("instance_preds", 0) + 4 * RIGHT).scale(0.4)
         self.play(
             *[ShrinkToPoint(o, bag_pred_obj.get_center()) for o in instance_pred_objs],
-            *[MoveToTarget(c) for c in instance_pred_obj_copies],
+            *[FadeGhost(c) for c in instance_pred_obj_copies],
+            FadeRows(instance_pred_matrix, range(len(instance_pred_objs), self.n_patches), 0.5),
             GrowFromCenter(bag_pred_obj),
             Write(bag_pred_text),
             run_time=3
         )
+        self.flatten(*instance_pred_obj_copies, instance_pred_matrix, bag_pred_text)
 
         # Write bag clz predictions
-        clz_bag_pred_text = Text("Urban: 21% \n"
-                                 "Agricultural: 57% \n"
-                                 "Rangeland: 12% \n"
-                                 "Forest: 8%\n"
-                                 "Water: 0% \n"
-                                 "Barren: 2%\n"
-                                 "Unknown: 0%",
+        clz_bag_pred_text = Text(self.class_proportions_text(self.bag_pred),
                                  font_size=25, color=BLACK, slant=ITALIC)
         clz_bag_pred_text.move_to(bag_pred_obj.get_center() + 1.5 * DOWN)
         self.play(Write(clz_bag_pred_text), run_time=3)
         self.wait(3)
 
-        # Create instance prediction grid (with overlay?)
-        grid_size = (3, 3)
-        final_patches = np.empty(grid_size, dtype=object)
-        final_patch_size = 0.7
-        final_patch_colours = [YELLOW, YELLOW, YELLOW, YELLOW, BLUE, YELLOW, YELLOW, BLUE, GREEN]
-        for col in range(grid_size[0]):
-            for row in range(grid_size[1]):
-                patch_path = "img/lcc/dg_lcc_{:d}_{:d}.png".format(row, col)
-                final_patch = ImageMobject(patch_path)
-                final_patch.height = final_patch.width = final_patch_size
-                final_patch.shift((2.5 + col * final_patch_size) * RIGHT
-                                  + (1.5 + row * final_patch_size) * DOWN).set_z_index(0)
-                final_patches[row][col] = final_patch
-        final_flat_patches = final_patches.ravel()
+    def outputs(self):
+        n_rows, n_cols = self.grid_size
+
+        # Show the scene image again, with the patch prediction mask over it
+        _, final_patch_size = grid_layout(self.grid_size, max_height=2.1, max_width=2.1, max_cell_size=0.7)
+        tiler = self.tiler
+        final_img = patch_cache.image_mobject(tiler.pixels[:n_rows * tiler.patch_height, :n_cols * tiler.patch_width],
+                                              height=n_rows * final_patch_size)
+        final_img.height = n_rows * final_patch_size
+        final_img.move_to((2.5 + (n_cols - 1) * final_patch_size / 2) * RIGHT
+                          + (1.5 + (n_rows - 1) * final_patch_size / 2) * DOWN).set_z_index(0)
         patch_pred_text = Text("Patch Prediction Mask", font_size=28, color=BLACK)
-        patch_pred_text.next_to(final_patches[1][1], direction=UP, buff=1).shift(1.1 * RIGHT)
+        patch_pred_text.next_to(final_img, direction=UP, buff=0.3).shift(1.1 * RIGHT)
         self.play(
-            *[FadeIn(p) for p in final_flat_patches],
+            FadeIn(final_img),
             Write(patch_pred_text),
         )
-        for idx, final_patch in enumerate(final_flat_patches):
-            square = Square()
-            square.move_to(final_patch)\
-                .set_z_index(1)\
-                .set_fill(color=final_patch_colours[idx], opacity=0.5)\
-                .set_stroke(width=0)
-            square.height = square.width = final_patch_size
-            self.play(GrowFromPoint(square, instance_pred_obj_copies[idx].get_center()))
-
-        agricultural_text = Text("Agricultural", font_size=28, color=YELLOW_E).next_to(final_patches[0][2], buff=0.3)
-        urban_text = Text("Urban", font_size=28, color=BLUE).next_to(final_patches[1][2], buff=0.3)
-        forest_text = Text("Forest", font_size=28, color=GREEN).next_to(final_patches[2][2], buff=0.3)
+        mask = PredictionMask(self.instance_preds, self.grid_size, [c[0] for c in self.class_colours], opacity=0.5)
+        mask.stretch_to_fit_width(final_img.width)
+        mask.stretch_to_fit_height(final_img.height)
+        mask.move_to(final_img).set_z_index(1)
+        self.play(RevealMask(mask), run_time=3)
+
+        # Legend of the predicted classes, in order of first appearance, alongside the grid rows
+        legend_texts = []
+        for idx, clz in enumerate(dict.fromkeys(mask.classes.ravel())):
+            legend_text = Text(self.class_names[clz], font_size=28, color=self.class_colours[clz][1])
+            if idx < n_rows:
+                legend_text.next_to(final_img, buff=0.3).set_y(mask.cell_center(idx, n_cols - 1)[1])
+            else:
+                legend_text.next_to(legend_texts[-1], direction=DOWN, aligned_edge=LEFT)
+            legend_texts.append(legend_text)
         self.wait(1)
         self.play(
-            Write(agricultural_text),
-            Write(urban_text),
-            Write(forest_text),
+            *[Write(t) for t in legend_texts],
             run_time=2
         )
         self.wait(1)
@@ -0,0 +1,356 @@
+import importlib
+import inspect
+import os
+
+import manim
+from manim import *
+from manim.animation.animation import prepare_animation
+from manim.renderer.cairo_renderer import CairoRenderer
+from manim.utils.exceptions import EndSceneEarlyException
+
+from disk_cache import fingerprint
+from label_cache import label_cache
+from profiler import profiler
+from stream_writer import StreamingFileWriter
+from util import ArrayMobject
+
+
+def unpremultiply(pixels):
+    """
+    Straight alpha copy of premultiplied RGBA pixels (as Cairo draws them).
+    """
+    alpha = pixels[..., 3:].astype(np.uint32)
+    rgb = (pixels[..., :3].astype(np.uint32) * 255 + alpha // 2) // np.maximum(alpha, 1)
+    straight = pixels.copy()
+    straight[..., :3] = np.minimum(rgb, 255)
+    return straight
+
+
+def premultiply(pixels):
+    """
+    Premultiplied alpha copy of straight alpha RGBA pixels (as PIL composites them).
+    """
+    alpha = pixels[..., 3:].astype(np.uint32)
+    premultiplied = pixels.copy()
+    premultiplied[..., :3] = (pixels[..., :3].astype(np.uint32) * alpha + 127) // 255
+    return premultiplied
+
+
+class LayerCamera(Camera):
+    """
+    Camera that draws mobjects over a transparent background into a straight alpha image, for flattened layers.
+    Cairo draws VMobjects with premultiplied alpha, while images are composited (by PIL) with straight alpha, so the
+    pixel array is converted to whichever one draws the next batch of mobjects.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(background_opacity=0, **kwargs)
+        self.premultiplied = False
+
+    def _convert(self, pixel_array, premultiplied):
+        # In place, as Cairo keeps drawing into the same array
+        if premultiplied != self.premultiplied:
+            pixel_array[:] = premultiply(pixel_array) if premultiplied else unpremultiply(pixel_array)
+            self.premultiplied = premultiplied
+
+    def display_multiple_non_background_colored_vmobjects(self, vmobjects, pixel_array):
+        self._convert(pixel_array, True)
+        return super().display_multiple_non_background_colored_vmobjects(vmobjects, pixel_array)
+
+    def display_multiple_background_colored_vmobjects(self, cvmobjects, pixel_array):
+        self._convert(pixel_array, False)
+        return super().display_multiple_background_colored_vmobjects(cvmobjects, pixel_array)
+
+    def display_multiple_image_mobjects(self, image_mobjects, pixel_array):
+        self._convert(pixel_array, False)
+        return super().display_multiple_image_mobjects(image_mobjects, pixel_array)
+
+    def layer(self):
+        """
+        Full-frame ImageMobject of everything drawn so far.
+        """
+        self._convert(self.pixel_array, False)
+        layer = ImageMobject(self.pixel_array.copy())
+        layer.height = config.frame_height
+        return layer.move_to(self.frame_center)
+
+
+class MILScene(Scene):
+    """
+    Base class for the MIL pipeline scenes.
+    The pipeline is split into sections (the methods named in `sections`), which construct plays in order after
+    load_data has loaded the scene's data and build_mobjects has built its mobjects.
+
+    Each section can be rendered on its own by setting render_sections: earlier sections are fast-forwarded
+    (played without rendering any frames) to deterministically rebuild the section's starting state,
+    and rendering stops as soon as the last requested section is done.
+    See render_sections.py for rendering sections in parallel.
+
+    Each section also has a content fingerprint, so unchanged sections can be reused between runs.
+
+    The data shown is given by bag, so the same scene can be rendered for different bags (see render_bags.py).
+
+    Mobjects that have settled (e.g. the faded copies and titles left behind by each stage) can be flattened into a
+    static image layer, so every later frame draws one image rather than all of them. A layer is unflattened
+    automatically if any of its mobjects is animated or removed again. Set MIL_CHECK_FLATTEN=1 to check that each
+    flatten leaves the frame unchanged (see check_flatten.py).
+
+    In storyboard mode (see storyboard.py), no video is made: only the settled frame after each step (play) or each
+    section is saved, as a PNG in storyboard_dir.
+
+    With stream_output, the video is written through one ffmpeg process for the whole scene rather than a partial
+    movie file per play (see stream_writer.py). Set MIL_STREAM_OUTPUT=1 to use it by default.
+
+    Set MIL_PROFILE=1 to profile the render (see profiler.py): every step is recorded, tagged with its section, and the
+    trace is saved to media/profiles.
+    """
+
+    # Bag to render the scene for
+    bag = None
+    # Patch grid (rows, cols) that the scene image is split into
+    grid_size = (3, 3)
+    # Names of the section methods, in order
+    sections = ()
+    # Names of the sections to render (None renders all of them)
+    render_sections = None
+    # Storyboard mode: None (render the video), "steps" or "sections" (which settled frames to save)
+    storyboard = None
+    # Directory the storyboard frames are saved to
+    storyboard_dir = None
+    # Write the video through a single encoder rather than a partial movie file per play
+    stream_output = os.environ.get("MIL_STREAM_OUTPUT", "0") == "1"
+    # Compare the frame before and after every flatten, and warn if it changed by more than flatten_tolerance
+    check_flatten = os.environ.get("MIL_CHECK_FLATTEN", "0") == "1"
+    flatten_tolerance = 8
+    # Modules whose code affects how every section looks
+    shared_modules = ("bag_data", "bags", "colourmap", "colourmap_luts", "digit_atlas", "image_cache", "label_cache",
+                      "layout", "mil_scene", "tiler", "util")
+
+    def __init__(self, stream_output=None, **kwargs):
+        if stream_output is not None:
+            self.stream_output = stream_output
+        if self.stream_output and config.renderer == RendererType.CAIRO and kwargs.get("renderer") is None:
+            kwargs["renderer"] = CairoRenderer(file_writer_class=StreamingFileWriter,
+                                               camera_class=kwargs.get("camera_class", Camera),
+                                               skip_animations=kwargs.get("skip_animations", False))
+        super().__init__(**kwargs)
+
+    def render(self, preview=False):
+        profiler.reset()
+        try:
+            with profiler.step(type(self).__name__, "render"):
+                result = super().render(preview)
+        finally:
+            # The patches aren't handed over if rendering stops before build_patches (e.g. an early exit)
+            self.close_patch_loader()
+        if profiler.enabled:
+            name = "{:s}_{:s}".format(str(config.output_file or type(self).__name__), config.quality or "custom")
+            path = profiler.save(os.path.join(config.media_dir, "profiles", name + ".json"), name)
+            logger.info("Profile saved to {:s}".format(path))
+        return result
+
+    def setup(self):
+        self.camera.background_color = WHITE
+        label_cache.reset_stats()
+        # Flattened static layers: (layer image, the mobjects drawn into it)
+        self.static_layers = []
+        # Largest change to any pixel made by each flatten (when check_flatten is set)
+        self.flatten_errors = []
+        # Name of the section being played, and the paths of the storyboard frames saved so far
+        self.current_section = None
+        self.storyboard_frames = []
+
+    def load_data(self):
+        """
+        Load the data used by the sections (images, features, predictions). Must be deterministic.
+        """
+        pass
+
+    def build_mobjects(self):
+        """
+        Build the mobjects used by the sections from the loaded data.
+        """
+        pass
+
+    @property
+    def tiler(self):
+        """
+        The bag's image tiler (see load_data), waiting for the patch loader to decode the image if needed.
+        """
+        return self.patch_loader.tiler
+
+    def close_patch_loader(self):
+        """
+        Shut down the patch loader's threads, if the scene has a patch loader (see load_data).
+        """
+        patch_loader = getattr(self, "patch_loader", None)
+        if patch_loader is not None:
+            patch_loader.close()
+
+    def build_patches(self):
+        """
+        Build the grid of patch images from the patch loader, placed in the scene image's grid.
+        """
+        self.patches = self.patch_loader.image_mobjects()
+        for (row, col), patch in np.ndenumerate(self.patches):
+            patch.height = patch.width = self.cell_size
+            patch.move_to(self.grid_centres[row, col]).set_z_index(1)
+        self.flat_patches = self.patches.ravel()
+
+    def section_inputs(self, name):
+        """
+        Data that a section depends on, besides its own code (e.g. the values it displays).
+        """
+        return []
+
+    def section_fingerprints(self):
+        """
+        Content fingerprint of each section, covering its code, its inputs and the render settings.
+        Every section also covers the whole scene module (e.g. the titles and layout set up in build_mobjects), and,
+        as a section starts from the state left by the previous one, all earlier sections.
+        Requires load_data to have been called.
+        """
+        shared_code = [inspect.getsource(importlib.import_module(m)) for m in self.shared_modules]
+        # Source of the scene class's module, and of any scene subclass modules in between
+        scene_modules = dict.fromkeys(inspect.getmodule(c) for c in type(self).__mro__ if issubclass(c, MILScene))
+        scene_code = [inspect.getsource(m) for m in scene_modules]
+        settings = [manim.__version__, config.pixel_width, config.pixel_height, config.frame_rate,
+                    ArrayMobject.label_mode, self.grid_size]
+        previous = fingerprint(type(self).__name__, shared_code, scene_code, settings)
+        fingerprints = {}
+        for name in self.sections:
+            previous = fingerprint(previous, name, inspect.getsource(getattr(type(self), name)),
+                                   self.section_inputs(name))
+            fingerprints[name] = previous
+        return fingerprints
+
+    @classmethod
+    def fingerprint_sections(cls):
+        """
+        Section fingerprints for the scene, computed without setting up a renderer or building any mobjects.
+        The patch loader isn't started, so no threads are left running (e.g. before forking section workers).
+        """
+        scene = cls.__new__(cls)
+        try:
+            scene.load_data()
+            return scene.section_fingerprints()
+        finally:
+            scene.close_patch_loader()
+
+    def construct(self):
+        with profiler.step("load_data", "setup"):
+            self.load_data()
+        with profiler.step("build_mobjects", "setup"):
+            self.build_mobjects()
+        for name in self.sections:
+            self.start_section(name)
+            getattr(self, name)()
+            if self.storyboard == "sections" and self._section_rendered(name):
+                self.save_storyboard_frame(name)
+        logger.info(label_cache.report())
+
+    def flatten(self, *mobjects):
+        """
+        Draw mobjects that won't move again into a single full-frame image, which replaces them in the scene.
+        The layer is drawn where the first of the mobjects was (by z-index and then scene order), so it's meant for
+        mobjects that sit behind anything still animating.
+        Mobjects inside a group in the scene (e.g. the group that an AnimationGroup added them in) are taken out of
+        it, as remove does. Mobjects that aren't in the scene at all are skipped with a warning.
+        """
+        # Scene order of the top-level mobject that each mobject in the scene is part of
+        top_level = {id(mob): idx for idx, top in enumerate(self.mobjects) for mob in top.get_family()}
+        members = [m for m in mobjects if id(m) in top_level]
+        if len(members) < len(mobjects):
+            logger.warning("Not flattening {:d} mobjects that aren't in the scene".format(len(mobjects) - len(members)))
+        if not members:
+            return None
+        before = self._draw_frame() if self.check_flatten else None
+        camera = LayerCamera()
+        camera.capture_mobjects(members)
+        layer = camera.layer().set_z_index(min(m.z_index for m in members))
+        self.mobjects.insert(min(top_level[id(m)] for m in members), layer)
+        super().remove(*members)
+        self.static_layers.append((layer, members))
+        if before is not None:
+            diff = np.abs(self._draw_frame() - before).max(axis=2)
+            self.flatten_errors.append(int(diff.max()))
+            if diff.max() > self.flatten_tolerance:
+                logger.warning("Flattening {:d} mobjects changed {:d} pixels of the frame (by up to {:d})".format(
+                    len(members), int(np.count_nonzero(diff > self.flatten_tolerance)), int(diff.max())))
+        return layer
+
+    def _draw_frame(self):
+        """
+        Draw every mobject in the scene into a new frame, without the renderer's cached static image.
+        """
+        camera = Camera(background_color=self.camera.background_color)
+        camera.capture_mobjects(self.mobjects + self.foreground_mobjects)
+        return camera.pixel_array.astype(int)
+
+    def unflatten(self, layer):
+        """
+        Put the mobjects of a flattened layer back into the scene in its place.
+        """
+        members = next(members for lyr, members in self.static_layers if lyr is layer)
+        self.static_layers = [(lyr, m) for lyr, m in self.static_layers if lyr is not layer]
+        idx = self.mobjects.index(layer)
+        self.mobjects[idx:idx + 1] = members
+
+    def _unflatten_any(self, mobjects):
+        ids = {id(mob) for m in mobjects for mob in m.get_family()}
+        for layer, members in list(self.static_layers):
+            if any(id(m) in ids for m in members):
+                self.unflatten(layer)
+
+    @staticmethod
+    def _animated_mobjects(animation):
+        # Animation groups only list the mobjects of their animations that aren't being introduced
+        if hasattr(animation, "animations"):
+            return [m for a in animation.animations for m in MILScene._animated_mobjects(a)]
+        return [animation.mobject]
+
+    def play(self, *args, **kwargs):
+        animations = [prepare_animation(a) for a in args]
+        if self.static_layers:
+            self._unflatten_any([m for a in animations for m in self._animated_mobjects(a)])
+        with profiler.step(", ".join(sorted({type(a).__name__ for a in animations})), "play") as record:
+            start_time = self.renderer.time
+            super().play(*animations, **kwargs)
+            if profiler.enabled:
+                skipped = self.renderer.skip_animations
+                record["frames"] = 0 if skipped else round((self.renderer.time - start_time) * config.frame_rate)
+                record["mobjects"] = len(self.get_mobject_family_members())
+        # Waits don't change the frame, so they don't get one of their own
+        if (self.storyboard == "steps" and self._section_rendered(self.current_section)
+                and not all(isinstance(a, Wait) for a in animations)):
+            self.save_storyboard_frame(self.current_section)
+
+    def save_storyboard_frame(self, label):
+        """
+        Save the current (settled) frame to the storyboard. It is drawn by the same camera as the video frames.
+        """
+        self.renderer.update_frame(self, ignore_skipping=True)
+        os.makedirs(self.storyboard_dir, exist_ok=True)
+        path = os.path.join(self.storyboard_dir, "{:03d}_{:s}.png".format(len(self.storyboard_frames), label))
+        self.camera.get_image().save(path)
+        self.storyboard_frames.append(path)
+        return path
+
+    def _section_rendered(self, name):
+        return self.render_sections is None or name in self.render_sections
+
+    def remove(self, *mobjects):
+        if self.static_layers:
+            self._unflatten_any(mobjects)
+        return super().remove(*mobjects)
+
+    def start_section(self, name):
+        self.current_section = profiler.stage = name
+        if self.render_sections is None:
+            self.next_section(name)
+            return
+        remaining = self.sections[self.sections.index(name):]
+        if not set(remaining) & set(self.render_sections):
+            # Nothing left to render, so stop early (Manim catches this and finishes the video)
+            raise EndSceneEarlyException()
+        self.next_section(name, skip_animations=name not in self.render_sections)
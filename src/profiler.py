@@ -0,0 +1,120 @@
+import functools
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak memory isn't recorded
+    resource = None
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far (MB), or None if it isn't available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024)
+
+
+class Profiler:
+    """
+    Opt-in profiler for scene renders (set MIL_PROFILE=1). Records the wall time of each step (every play and wait,
+    and the construction of the mobjects and animations wrapped with profiled), tagged with the pipeline stage
+    (section) it happened in, plus whatever stats the step adds (e.g. frames rendered and live mobjects) and the
+    peak memory so far.
+
+    Records are saved as a Chrome trace (open in chrome://tracing or Perfetto), with a per-stage summary, and are
+    written deterministically (sorted keys, times relative to the start) so runs can be diffed.
+    When disabled, a step is a single flag check.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.events = []
+        self.stage = None
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def step(self, name, category):
+        """
+        Record the enclosed code as a step. Yields a dict that the caller can add stats to.
+        """
+        record = {}
+        if not self.enabled:
+            yield record
+            return
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            end = time.perf_counter()
+            record["stage"] = self.stage
+            record["peak_rss_mb"] = peak_rss_mb()
+            self.events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self.start_time) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "pid": 1,
+                "tid": 1,
+                "args": record,
+            })
+
+    def summary(self):
+        """
+        Total time, count and frames of each category of step per stage, and the peak memory of each stage.
+        """
+        stages = defaultdict(lambda: defaultdict(lambda: {"count": 0, "time": 0.0, "frames": 0}))
+        peaks = {}
+        for event in self.events:
+            stage = str(event["args"]["stage"])
+            totals = stages[stage][event["cat"]]
+            totals["count"] += 1
+            totals["time"] += event["dur"] / 1e6
+            totals["frames"] += event["args"].get("frames", 0)
+            peak = event["args"]["peak_rss_mb"]
+            if peak is not None:
+                peaks[stage] = max(peaks.get(stage, 0), peak)
+        return {stage: {"steps": dict(categories), "peak_rss_mb": peaks.get(stage)}
+                for stage, categories in stages.items()}
+
+    def save(self, path, name):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        trace = {
+            "traceEvents": [{"name": "process_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": name}}]
+                           + self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"scene": name, "stages": self.summary()},
+        }
+        with open(path, "w") as f:
+            json.dump(trace, f, indent=1, sort_keys=True)
+        return path
+
+
+def profiled(name):
+    """
+    Decorator recording each call of a function (e.g. a constructor) as a step, when profiling is enabled.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.step(name, "construct"):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+profiler = Profiler(enabled=os.environ.get("MIL_PROFILE", "0") == "1")
@@ -0,0 +1,114 @@
+"""
+Render a MIL scene once per bag (one video each) using a pool of worker processes, and write a summary of the
+per-bag render times.
+
+Bags are given by a JSON manifest or a directory of bags (see bags.load_bags).
+All workers use the same media directory, so the TeX, label and patch image caches are shared (each bag's video has
+its own partial movie files). Bag names must be unique, as they name the videos.
+
+Usage (from the src directory):
+
+`python render_bags.py mil_manim_luc.py MILManimLUC ../bags -q l -j 4 --max-memory 4096 --summary summary.json`
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from manim import config
+
+from bags import load_bags
+from render_sections import QUALITIES, render_scene
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the per-worker memory limit isn't supported
+    resource = None
+
+
+def _init_worker(media_dir, max_memory):
+    if media_dir is not None:
+        config.media_dir = media_dir
+    if max_memory is not None:
+        if resource is None:
+            raise RuntimeError("--max-memory isn't supported on this platform")
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+
+def _render_bag(args):
+    module_path, scene_name, quality, bag, stream = args
+    try:
+        movie_path, elapsed = render_scene(module_path, scene_name, quality,
+                                           output_file="{:s}_{:s}".format(scene_name, bag.name), bag=bag,
+                                           stream=stream)
+    except Exception as e:
+        return bag.name, {"error": "{:s}: {:}".format(type(e).__name__, e)}
+    return bag.name, {"output": movie_path, "time": elapsed}
+
+
+def render_bags(module_path, scene_name, bags, quality, n_workers=None, media_dir=None, max_memory=None,
+                tasks_per_worker=1, stream=None):
+    """
+    Render the scene for each bag in a process pool. Each worker renders at most tasks_per_worker bags before it is
+    replaced (freeing everything it allocated) and, if max_memory (bytes) is given, can't use more memory than that.
+    A bag that fails to render is reported in the summary rather than stopping the other bags.
+    Returns a summary of the output video and render time of each bag.
+    """
+    names = [bag.name for bag in bags]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError("Bag names must be unique, but these are repeated: {:s}".format(", ".join(duplicates)))
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=n_workers, max_tasks_per_child=tasks_per_worker,
+                             initializer=_init_worker, initargs=(media_dir, max_memory)) as pool:
+        futures = [pool.submit(_render_bag, (module_path, scene_name, quality, bag, stream)) for bag in bags]
+        for bag, future in zip(bags, futures):
+            try:
+                name, result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed for using too much memory)
+                name, result = bag.name, {"error": "{:s}: {:}".format(type(e).__name__, e)}
+            results[name] = result
+            print("{:s}: {:s}".format(name, "{:.1f}s".format(result["time"]) if "time" in result else result["error"]))
+    return {
+        "scene": scene_name,
+        "quality": quality,
+        "bags": results,
+        "total_render_time": sum(r["time"] for r in results.values() if "time" in r),
+        "wall_time": time.perf_counter() - start,
+        "failed": [name for name, r in results.items() if "error" in r],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", help="Scene module, e.g. mil_manim_luc.py")
+    parser.add_argument("scene", help="Scene class name, e.g. MILManimLUC")
+    parser.add_argument("bags", help="Bag manifest (JSON) or directory of bags")
+    parser.add_argument("-q", "--quality", choices=QUALITIES.keys(), default="l")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--max-memory", type=int, default=None, help="Memory limit per worker (MB)")
+    parser.add_argument("--tasks-per-worker", type=int, default=1,
+                        help="Number of bags a worker renders before it is replaced")
+    parser.add_argument("--media-dir", default=None, help="Media directory shared by all workers")
+    parser.add_argument("--summary", default=None, help="Path to write the JSON summary to")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="Write each video through a single encoder rather than a partial movie file per play "
+                             "(default: set by MIL_STREAM_OUTPUT)")
+    args = parser.parse_args()
+
+    bags = load_bags(args.bags)
+    max_memory = None if args.max_memory is None else args.max_memory * 1024 * 1024
+    summary = render_bags(args.module, args.scene, bags, QUALITIES[args.quality], args.jobs, args.media_dir,
+                          max_memory, args.tasks_per_worker, args.stream)
+
+    print(json.dumps(summary, indent=2))
+    if args.summary is not None:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Render the sections of a MIL scene in parallel and concatenate them into one video (without re-encoding).
+Sections that haven't changed since a previous run are reused from the section cache rather than re-rendered.
+
+Usage (from the src directory):
+
+`python render_sections.py mil_manim.py MILManim -q l -j 6 --compare`
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from manim import config, tempconfig
+
+from section_cache import SectionCache
+
+QUALITIES = {
+    "l": "low_quality",
+    "m": "medium_quality",
+    "h": "high_quality",
+    "p": "production_quality",
+    "k": "fourk_quality",
+}
+
+
+def load_scene_class(module_path, scene_name):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(module_path))[0], module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, scene_name)
+
+
+def render_scene(module_path, scene_name, quality, sections=None, output_file=None, disable_caching=False,
+                 bag=None, stream=None):
+    """
+    Render a scene (or only some of its sections), optionally for a given bag,
+    and return the path of the video and the wall time taken.
+    Each output file gets its own partial movie directory, so renders running at the same time (e.g. of different
+    sections or bags) never clean up each other's partial movie files.
+    If stream is given, it sets whether the video is written through a single encoder (see stream_writer.py).
+    """
+    start = time.perf_counter()
+    scene_cls = load_scene_class(module_path, scene_name)
+    output_file = output_file or scene_name
+    options = {
+        "quality": quality,
+        "output_file": output_file,
+        "preview": False,
+        "disable_caching": disable_caching,
+        "partial_movie_dir": os.path.join("{video_dir}", "partial_movie_files", "{scene_name}", output_file),
+    }
+    with tempconfig(options):
+        scene = scene_cls(stream_output=stream)
+        scene.render_sections = sections
+        if bag is not None:
+            scene.bag = bag
+        scene.render()
+        movie_path = str(scene.renderer.file_writer.movie_file_path)
+    return movie_path, time.perf_counter() - start
+
+
+def _render_section(args):
+    module_path, scene_name, quality, section, disable_caching, stream = args
+    movie_path, elapsed = render_scene(module_path, scene_name, quality, sections=(section,),
+                                       output_file="{:s}_{:s}".format(scene_name, section),
+                                       disable_caching=disable_caching, stream=stream)
+    return section, movie_path, elapsed
+
+
+def concat_videos(paths, output_path):
+    """
+    Concatenate videos with the same encoding settings using ffmpeg's concat demuxer (no re-encoding).
+    """
+    list_path = output_path + ".txt"
+    with open(list_path, "w") as f:
+        for path in paths:
+            f.write("file '{:s}'\n".format(os.path.abspath(path).replace("'", r"'\''")))
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy",
+         output_path],
+        check=True,
+    )
+    os.remove(list_path)
+
+
+def render_parallel(module_path, scene_name, quality, n_workers=None, disable_caching=False, section_cache=None,
+                    stream=None):
+    """
+    Render the sections of a scene in a process pool and stitch them together.
+    If a section cache is given, only sections that aren't already cached are rendered.
+    Returns the path of the final video and a report of the section render times and cache hits/misses.
+    """
+    scene_cls = load_scene_class(module_path, scene_name)
+    start = time.perf_counter()
+    videos = {}
+    if section_cache is not None:
+        with tempconfig({"quality": quality}):
+            fingerprints = scene_cls.fingerprint_sections()
+        for section in scene_cls.sections:
+            cached_path = section_cache.get(fingerprints[section])
+            if cached_path is not None:
+                videos[section] = cached_path
+    hits = [s for s in scene_cls.sections if s in videos]
+    misses = [s for s in scene_cls.sections if s not in videos]
+
+    results = []
+    if misses:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_render_section,
+                                    [(module_path, scene_name, quality, s, disable_caching, stream) for s in misses]))
+    for section, movie_path, _ in results:
+        if section_cache is not None:
+            movie_path = section_cache.put(fingerprints[section], movie_path)
+        videos[section] = movie_path
+
+    with tempconfig({"quality": quality}):
+        output_dir = os.path.join(config.media_dir, "videos", "sections")
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, "{:s}_{:s}.mp4".format(scene_name, quality))
+    concat_videos([videos[s] for s in scene_cls.sections], output_path)
+    report = {
+        "scene": scene_name,
+        "quality": quality,
+        "hits": hits,
+        "misses": misses,
+        "sections": {section: elapsed for section, _, elapsed in results},
+        "parallel_wall_time": time.perf_counter() - start,
+    }
+    return output_path, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", help="Scene module, e.g. mil_manim.py")
+    parser.add_argument("scene", help="Scene class name, e.g. MILManim")
+    parser.add_argument("-q", "--quality", choices=QUALITIES.keys(), default="l")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also render serially and compare wall time (implies --full)")
+    parser.add_argument("--full", action="store_true", help="Re-render every section, ignoring the section cache")
+    parser.add_argument("--cache-size", type=int, default=2048, help="Section cache size limit (MB)")
+    parser.add_argument("--report", default=None, help="Path to write the JSON report to")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="Write each video through a single encoder rather than a partial movie file per play "
+                             "(default: set by MIL_STREAM_OUTPUT)")
+    args = parser.parse_args()
+
+    quality = QUALITIES[args.quality]
+    # When comparing, all caching of rendered video is disabled so neither render can reuse the other's output
+    section_cache = None
+    if not (args.full or args.compare):
+        section_cache = SectionCache(max_bytes=args.cache_size * 1024 * 1024)
+    output_path, report = render_parallel(args.module, args.scene, quality, args.jobs,
+                                          disable_caching=args.compare, section_cache=section_cache,
+                                          stream=args.stream)
+    report["output"] = output_path
+    if section_cache is not None:
+        print("Section cache hits: {:s}".format(", ".join(report["hits"]) or "none"))
+        print("Section cache misses: {:s}".format(", ".join(report["misses"]) or "none"))
+    if args.compare:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            _, serial_time = pool.submit(render_scene, args.module, args.scene, quality,
+                                         disable_caching=True, stream=args.stream).result()
+        report["serial_wall_time"] = serial_time
+        report["speedup"] = serial_time / report["parallel_wall_time"]
+
+    print(json.dumps(report, indent=2))
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
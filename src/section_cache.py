@@ -0,0 +1,50 @@
+import os
+import shutil
+
+from manim import config
+
+from disk_cache import evict_lru, temp_path, touch
+
+
+class SectionCache:
+    """
+    Local cache of rendered section videos, keyed by section fingerprint (see MILScene.section_fingerprints).
+    Least recently used videos are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024 * 1024 * 1024):
+        self._cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def cache_dir(self):
+        # Resolved lazily so the cache follows any changes to the Manim config (e.g. --media_dir)
+        if self._cache_dir is None:
+            return os.path.join(config.media_dir, "section_cache")
+        return self._cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".mp4")
+
+    def get(self, key):
+        """
+        Path of the cached video for a section, or None if it isn't cached.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        touch(path)
+        return path
+
+    def put(self, key, video_path):
+        """
+        Store a rendered section video and return the path of the cached copy.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = temp_path(path)
+        shutil.copyfile(video_path, tmp_path)
+        os.replace(tmp_path, path)
+        # Never evict the video that was just stored, even if it alone is over the limit
+        evict_lru(self.cache_dir, max(self.max_bytes, os.path.getsize(path)), ".mp4")
+        return path
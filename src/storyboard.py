@@ -0,0 +1,93 @@
+"""
+Render a storyboard of a MIL scene: a PNG of the settled frame after each step (or each section) and a contact sheet
+of them all, without rendering any animation frames or encoding any video. The stills are drawn by the same camera
+at the same quality as the video frames, so they match the video's frames once each step has settled.
+
+Usage (from the src directory):
+
+`python storyboard.py mil_manim.py MILManim -q l --by steps`
+"""
+import argparse
+import os
+import time
+
+from PIL import Image, ImageDraw
+from manim import config, tempconfig
+
+from render_sections import QUALITIES, load_scene_class
+
+
+def contact_sheet(paths, output_path, n_cols=4, thumb_width=480, pad=8, label_height=20):
+    """
+    Tile the storyboard frames into a single image, in order, each labelled with its file name.
+    """
+    thumbs = []
+    for path in paths:
+        with Image.open(path) as image:
+            thumb_height = round(image.height * thumb_width / image.width)
+            thumbs.append(image.convert("RGB").resize((thumb_width, thumb_height), Image.LANCZOS))
+    n_rows = -(-len(thumbs) // n_cols)
+    cell_width = thumb_width + pad
+    cell_height = max(t.height for t in thumbs) + label_height + pad
+    sheet = Image.new("RGB", (n_cols * cell_width + pad, n_rows * cell_height + pad), "white")
+    draw = ImageDraw.Draw(sheet)
+    for idx, (path, thumb) in enumerate(zip(paths, thumbs)):
+        x = pad + (idx % n_cols) * cell_width
+        y = pad + (idx // n_cols) * cell_height
+        draw.text((x, y), os.path.splitext(os.path.basename(path))[0], fill="black")
+        sheet.paste(thumb, (x, y + label_height))
+    sheet.save(output_path)
+    return output_path
+
+
+def render_storyboard(module_path, scene_name, quality, by="steps", output_dir=None, sections=None, bag=None):
+    """
+    Render the storyboard of a scene (or only some of its sections), optionally for a given bag.
+    Returns the paths of the frames and of the contact sheet, and the wall time taken.
+    """
+    start = time.perf_counter()
+    scene_cls = load_scene_class(module_path, scene_name)
+    # Every animation is skipped (only its final state is computed) and nothing is written to a movie
+    options = {
+        "quality": quality,
+        "preview": False,
+        "skip_animations": True,
+        "write_to_movie": False,
+        "save_last_frame": False,
+    }
+    with tempconfig(options):
+        if output_dir is None:
+            output_dir = os.path.join(config.media_dir, "storyboards", "{:s}_{:s}".format(scene_name, quality))
+        scene = scene_cls()
+        scene.storyboard = by
+        scene.storyboard_dir = output_dir
+        scene.render_sections = sections
+        if bag is not None:
+            scene.bag = bag
+        scene.render()
+        frames = scene.storyboard_frames
+    sheet_path = contact_sheet(frames, os.path.join(output_dir, "contact_sheet.png")) if frames else None
+    return frames, sheet_path, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", help="Scene module, e.g. mil_manim.py")
+    parser.add_argument("scene", help="Scene class name, e.g. MILManim")
+    parser.add_argument("-q", "--quality", choices=QUALITIES.keys(), default="l")
+    parser.add_argument("--by", choices=("steps", "sections"), default="steps",
+                        help="Save a frame after every step, or only after every section")
+    parser.add_argument("--sections", nargs="+", default=None, help="Only storyboard these sections")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory for the frames (default: media/storyboards/<scene>_<quality>)")
+    args = parser.parse_args()
+
+    frames, sheet_path, elapsed = render_storyboard(args.module, args.scene, QUALITIES[args.quality], args.by,
+                                                    args.output_dir, args.sections)
+    print("{:d} frames in {:.1f}s".format(len(frames), elapsed))
+    if sheet_path is not None:
+        print("Contact sheet: {:s}".format(sheet_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import queue
+import threading
+
+import numpy as np
+from manim import config, logger
+from manim.scene.scene_file_writer import SceneFileWriter
+from manim.utils.file_ops import is_png_format, write_to_movie
+
+from disk_cache import temp_path
+
+
+class StreamingFileWriter(SceneFileWriter):
+    """
+    Writes the whole scene to its video through a single ffmpeg process, rather than writing each play to its own
+    partial movie file (with its own ffmpeg process) and concatenating them at the end.
+
+    Frames are passed to a writer thread through a bounded queue, so the next frames are rendered while ffmpeg encodes
+    the previous ones, and at most queue_size frames are held in memory if encoding falls behind.
+    Partial movie caching doesn't apply (every play is rendered), and scenes with sound aren't supported.
+    """
+
+    queue_size = 64
+
+    def __init__(self, renderer, scene_name, **kwargs):
+        if not hasattr(SceneFileWriter, "open_movie_pipe"):
+            raise RuntimeError("Streaming output needs manim 0.17 or 0.18 (which write videos through an ffmpeg pipe)")
+        self.frame_queue = None
+        self.writer_thread = None
+        self.stream_error = None
+        super().__init__(renderer, scene_name, **kwargs)
+
+    def is_already_cached(self, hash_invocation):
+        return False
+
+    def add_partial_movie_file(self, hash_animation):
+        pass
+
+    def begin_animation(self, allow_write=False, file_path=None):
+        # The stream is opened by the first play that is written, and stays open until the scene is finished
+        if write_to_movie() and allow_write and self.frame_queue is None:
+            self.open_stream()
+
+    def end_animation(self, allow_write=False):
+        pass
+
+    def write_frame(self, frame_or_renderer):
+        if not write_to_movie():
+            super().write_frame(frame_or_renderer)
+            return
+        if self.stream_error is not None:
+            raise RuntimeError("Writing to ffmpeg failed") from self.stream_error
+        self.frame_queue.put(frame_or_renderer)
+        if is_png_format() and not config["dry_run"]:
+            self.output_image_from_array(frame_or_renderer)
+
+    def open_stream(self):
+        self.stream_path = temp_path(str(self.movie_file_path))
+        self.open_movie_pipe(file_path=self.stream_path)
+        self.frame_queue = queue.Queue(maxsize=self.queue_size)
+        self.writer_thread = threading.Thread(target=self._write_frames, daemon=True)
+        self.writer_thread.start()
+
+    def _write_frames(self):
+        stdin = self.writing_process.stdin
+        while True:
+            frame = self.frame_queue.get()
+            if frame is None:
+                return
+            if self.stream_error is not None:
+                # Keep draining the queue, so the renderer is never blocked on a full queue
+                continue
+            try:
+                stdin.write(np.ascontiguousarray(frame).data)
+            except (BrokenPipeError, OSError) as e:
+                self.stream_error = e
+
+    def close_stream(self):
+        self.frame_queue.put(None)
+        self.writer_thread.join()
+        try:
+            self.writing_process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return_code = self.writing_process.wait()
+        if self.stream_error is not None or return_code != 0:
+            raise RuntimeError("ffmpeg failed to write {:s} (exit code {:d})".format(self.stream_path, return_code))
+        os.replace(self.stream_path, self.movie_file_path)
+        logger.info("Streamed {:d} plays into one movie file".format(self.renderer.num_plays))
+
+    def finish(self):
+        if not write_to_movie():
+            super().finish()
+            return
+        if self.includes_sound:
+            logger.warning("Sound isn't supported when streaming the video, so it is left out")
+        if self.frame_queue is not None:
+            self.close_stream()
+            self.print_file_ready_message(self.movie_file_path)
+        if self.subcaptions:
+            self.write_subcaption_file()
@@ -0,0 +1,70 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+
+@lru_cache(maxsize=16)
+def decode_image(path):
+    """
+    Decode an image file into a read-only (H x W x C) uint8 array.
+    Decoded images are cached, so every later use of the same file shares one buffer.
+    """
+    with Image.open(path) as image:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        pixels = np.asarray(image)
+    pixels.flags.writeable = False
+    return pixels
+
+
+class ImageTiler:
+    """
+    Splits one decoded image into an R x C grid of patches.
+    Patches are zero-copy views of the decoded buffer; any remainder pixels at the right/bottom edges are dropped.
+    """
+
+    def __init__(self, pixels, grid_size):
+        self.pixels = pixels
+        self.grid_size = grid_size
+        n_rows, n_cols = grid_size
+        self.patch_height = pixels.shape[0] // n_rows
+        self.patch_width = pixels.shape[1] // n_cols
+        if self.patch_height == 0 or self.patch_width == 0:
+            raise ValueError("Grid {:} is too fine for an image of shape {:}".format(grid_size, pixels.shape))
+
+    @classmethod
+    def from_file(cls, path, grid_size):
+        return cls(decode_image(path), grid_size)
+
+    @classmethod
+    def from_patch_files(cls, path_format, grid_size, executor=None):
+        """
+        Stitch pre-cut patch files into a single buffer, e.g. path_format="img/crc/crc_{row:d}_{col:d}.png".
+        If an executor (e.g. a ThreadPoolExecutor) is given, the files are decoded concurrently.
+        """
+        n_rows, n_cols = grid_size
+        paths = [path_format.format(row=row, col=col) for row in range(n_rows) for col in range(n_cols)]
+        decoded = list(executor.map(decode_image, paths) if executor is not None else map(decode_image, paths))
+        rows = [np.concatenate(decoded[row * n_cols:(row + 1) * n_cols], axis=1) for row in range(n_rows)]
+        pixels = np.concatenate(rows, axis=0)
+        pixels.flags.writeable = False
+        return cls(pixels, grid_size)
+
+    def patch(self, row, col):
+        """
+        View of the patch at the given grid position.
+        """
+        top = row * self.patch_height
+        left = col * self.patch_width
+        return self.pixels[top:top + self.patch_height, left:left + self.patch_width]
+
+    def patches(self):
+        """
+        Grid (R x C object array) of patch views.
+        """
+        patches = np.empty(self.grid_size, dtype=object)
+        for row in range(self.grid_size[0]):
+            for col in range(self.grid_size[1]):
+                patches[row, col] = self.patch(row, col)
+        return patches
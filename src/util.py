@@ -1,94 +1,668 @@
+import copy
 import math
+import os
 
-import matplotlib as mpl
 from manim import *
 
+from colourmap import colour_map_matrix
+from digit_atlas import stamp_labels
+from label_cache import label_cache
+from profiler import profiled
 
-class ShrinkToPoint(Transform):
+
+class PointScale(Animation):
+    """
+    Base for animations that only scale a mobject about a point (shrinking it into, or growing it out of, the point).
+    Only the mobject's points are updated: unlike the equivalent Transforms, no copies of the mobject are made,
+    so the pixel data of images is never copied.
+    """
+
+    def __init__(self, mobject, point, **kwargs):
+        self.point = np.array(point, dtype=float)
+        super().__init__(mobject, **kwargs)
+
+    def create_starting_mobject(self):
+        return self.mobject
+
+    def interpolate_mobject(self, alpha):
+        self.scale_points(self.rate_func(alpha))
+
+    def scale_points(self, alpha):
+        raise NotImplementedError
+
+
+class ShrinkToPoint(PointScale):
+    """
+    Shrink an object to a specific point.
+    Each frame moves the object's points the (eased) fraction alpha of the remaining way to the point, which is how the
+    original Transform-based version behaved.
+    """
+
+    @profiled("ShrinkToPoint")
+    def __init__(self, mobject, point, **kwargs):
+        super().__init__(mobject, point, introducer=True, **kwargs)
+
+    def scale_points(self, alpha):
+        for mob in self.mobject.get_family():
+            if len(mob.points) > 0:
+                mob.points = self.point + (1 - alpha) * (mob.points - self.point)
+
+
+class GrowFromPoint(PointScale):
+    """
+    Grow an object out of a specific point (a drop-in for Manim's GrowFromPoint, without a point_color).
+    """
+
+    def __init__(self, mobject, point, **kwargs):
+        super().__init__(mobject, point, introducer=True, **kwargs)
+
+    def begin(self):
+        # Only the final points are kept, not a copy of the mobject
+        self.final_points = [(mob, mob.points.copy()) for mob in self.mobject.get_family() if len(mob.points) > 0]
+        super().begin()
+
+    def scale_points(self, alpha):
+        for mob, points in self.final_points:
+            mob.points = self.point + alpha * (points - self.point)
+
+
+class GrowFromCenter(GrowFromPoint):
+    """
+    Grow an object out of its centre (a drop-in for Manim's GrowFromCenter, without a point_color).
+    """
+
+    def __init__(self, mobject, **kwargs):
+        super().__init__(mobject, mobject.get_center(), **kwargs)
+
+
+class ShiftBy(Animation):
+    """
+    Move a mobject by an offset. Only its points are updated: unlike mobject.animate.shift, no copy of the mobject is
+    made, so the pixel data of images (e.g. a BagMatrixMobject's texture) is never copied or interpolated.
+    """
+
+    def __init__(self, mobject, offset, **kwargs):
+        self.offset = np.array(offset, dtype=float)
+        super().__init__(mobject, **kwargs)
+
+    def create_starting_mobject(self):
+        return self.mobject
+
+    def begin(self):
+        self.start_points = [(mob, mob.points.copy()) for mob in self.mobject.get_family() if len(mob.points) > 0]
+        super().begin()
+
+    def interpolate_mobject(self, alpha):
+        offset = self.rate_func(alpha) * self.offset
+        for mob, points in self.start_points:
+            mob.points = points + offset
+
+
+class GhostImageMobject(ImageMobject):
     """
-    Transform to shrink an object to a specific point.
+    An image in a ghost (see ghost) that shares its pixel data with the image it was copied from.
+    Its opacity is kept separately and only applied to the pixels when they're drawn, so the shared data is never
+    written to. The faded pixels are kept until the opacity or the pixels change (written to through own_pixels, or
+    replaced).
     """
 
-    def __init__(
-        self, mobject: Mobject, point: np.ndarray, **kwargs
-    ) -> None:
-        self.point = point
-        super().__init__(mobject, introducer=True, **kwargs)
+    ghost_opacity = 1.0
+    # (opacity, pixel array, faded copy of it)
+    faded_pixels = None
+
+    def set_opacity(self, alpha):
+        self.ghost_opacity = alpha
+        self.fill_opacity = alpha
+        self.stroke_opacity = alpha
+        return self
+
+    def get_pixel_array(self):
+        if self.ghost_opacity == 1:
+            return self.pixel_array
+        faded = self.faded_pixels
+        if faded is None or faded[0] != self.ghost_opacity or faded[1] is not self.pixel_array:
+            # Scale the image's own alpha, so transparent pixels stay transparent
+            pixels = self.pixel_array.copy()
+            pixels[:, :, 3] = np.round(pixels[:, :, 3] * self.ghost_opacity).astype(pixels.dtype)
+            self.faded_pixels = (self.ghost_opacity, self.pixel_array, pixels)
+        return self.faded_pixels[2]
+
+    def interpolate_color(self, mobject1, mobject2, alpha):
+        if isinstance(mobject1, GhostImageMobject) and isinstance(mobject2, GhostImageMobject):
+            self.set_opacity(interpolate(mobject1.ghost_opacity, mobject2.ghost_opacity, alpha))
+        else:
+            super().interpolate_color(mobject1, mobject2, alpha)
+
+
+def ghost(mobject):
+    """
+    Copy a mobject to leave behind as a faded "ghost" (fade it with FadeGhost).
+    Unlike mobject.copy(), the pixel data of its images isn't copied but shared (copy-on-write): the shared pixel
+    arrays are made read-only, and own_pixels gives an image its own copy before it is written to.
+    Points are still copied, as Manim transforms them in place.
+    """
+    memo = {}
+    for mob in mobject.get_family():
+        if isinstance(mob, ImageMobject):
+            mob.pixel_array.flags.writeable = False
+            memo[id(mob.pixel_array)] = mob.pixel_array
+    copied = copy.deepcopy(mobject, memo)
+    for mob in copied.get_family():
+        if isinstance(mob, ImageMobject) and not isinstance(mob, GhostImageMobject):
+            mob.__class__ = GhostImageMobject
+    return copied
+
+
+def own_pixels(image):
+    """
+    The pixel array of an image, copied first if it is shared with a ghost (copy-on-write), ready to be written to.
+    """
+    if not image.pixel_array.flags.writeable:
+        image.pixel_array = image.pixel_array.copy()
+    if isinstance(image, GhostImageMobject):
+        image.faded_pixels = None
+    return image.pixel_array
+
+
+class FadeGhost(Animation):
+    """
+    Fade a ghost (or any mobject) to the given opacity, without copying it.
+    """
 
-    def create_target(self) -> Mobject:
-        end = super().create_starting_mobject()
-        end.scale(0)
-        end.move_to(self.point)
-        return end
+    def __init__(self, mobject, opacity=0.5, **kwargs):
+        self.opacity = opacity
+        super().__init__(mobject, **kwargs)
 
-    def create_starting_mobject(self) -> Mobject:
+    def create_starting_mobject(self):
         return self.mobject
 
+    def interpolate_mobject(self, alpha):
+        opacity = interpolate(1, self.opacity, self.rate_func(alpha))
+        for mob in self.mobject.get_family():
+            if isinstance(mob, VMobject):
+                mob.set_opacity(opacity, family=False)
+            elif isinstance(mob, GhostImageMobject):
+                mob.set_opacity(opacity)
+
+
+class ArrayMobject(Group):
+    """
+    A way to represent arrays in Manim: a row of colour mapped cells, one per element, each labelled with its value.
+
+    The cells are drawn from a single texture (one ImageMobject), so cell_pixels gives views of it and updating,
+    recolouring or splitting the array only touches the cells involved rather than rebuilding it.
+
+    cmap is the name of a colour map (built-in lookup tables are used for viridis and the other perceptually uniform
+    maps, so no Matplotlib import is needed) or a callable such as a Matplotlib colour map.
+
+    Labels are drawn in one of two modes:
+        "tex" - a MathTex label per element (default).
+        "atlas" - labels are rasterized from a digit atlas straight into the texture, so each array is a single
+                  image and no TeX install is needed. Set MIL_LABEL_MODE=atlas to use it by default.
+    """
+
+    label_mode = os.environ.get("MIL_LABEL_MODE", "tex")
+    # Texture pixels per element in atlas mode
+    atlas_cell_px = 40
+
+    @profiled("ArrayMobject")
+    def __init__(self, array, cmap, vmin, vmax, img_values=None, label_mode=None, **kwargs):
+        super().__init__(**kwargs)
+        self.array = np.array(array, dtype=float).ravel()
+        self.cmap = cmap
+        self.vmin = vmin
+        self.vmax = vmax
+        if label_mode is not None:
+            self.label_mode = label_mode
+        if self.label_mode not in ("tex", "atlas"):
+            raise ValueError("Unknown label mode: {:s}".format(self.label_mode))
+        if img_values is None:
+            img_values = colour_map_matrix(self.array.reshape(1, -1), cmap, vmin, vmax)
+        # Colour of each cell (1 x N x 3), without labels
+        self.img_values = img_values
+
+        if self.label_mode == "atlas":
+            self.cell_px = self.atlas_cell_px
+            texture = stamp_labels(img_values, self._label_texts(), cell_px=self.cell_px)
+        else:
+            self.cell_px = 1
+            texture = img_values
+        self.image = ImageMobject(texture)
+        self.image.set_resampling_algorithm(RESAMPLING_ALGORITHMS["nearest"])
+        self.image.height = 1
+        self.add(self.image)
+
+        self.labels = []
+        if self.label_mode == "tex":
+            for idx, text in enumerate(self._label_texts()):
+                label = self._create_label(text, idx)
+                self.labels.append(label)
+                self.add(label)
+
+    @classmethod
+    def from_batch(cls, batch, idx, label_mode=None):
+        """
+        Create the array for one row of an ArrayBatch, sharing the batch's colour mapped buffer.
+        """
+        return cls(batch.matrix[idx], batch.cmap, batch.vmin, batch.vmax, img_values=batch.row_texture(idx),
+                   label_mode=label_mode)
+
+    @property
+    def n_cells(self):
+        return len(self.array)
+
+    def _label_texts(self, indices=None):
+        values = self.array if indices is None else self.array[indices]
+        # TODO sort out -0.0 labels
+        return ["{:.1f}".format(v) for v in values]
+
+    def _create_label(self, text, idx):
+        label = label_cache.get(text, scale=0.8, colour=WHITE)
+        label.scale(self.image.height)
+        label.move_to(self.cell_center(idx))
+        return label
 
-class ArrayMobject:
+    def cell_center(self, idx):
+        """
+        Centre of a cell in the scene (following any moves, scaling or rotation of the array).
+        """
+        upper_left, upper_right, lower_left = self.image.points[:3]
+        return upper_left + (upper_right - upper_left) * (idx + 0.5) / self.n_cells + (lower_left - upper_left) / 2
+
+    def cell_pixels(self, idx):
+        """
+        View of a cell's pixels (RGBA) in the texture. Writing to it changes how the cell is drawn.
+        """
+        return own_pixels(self.image)[:, idx * self.cell_px:(idx + 1) * self.cell_px]
+
+    def _paint(self, indices):
+        """
+        Recolour (and in atlas mode, relabel) the given cells from their current values.
+        """
+        if not self.img_values.flags.owndata:
+            # Copy on first write, rather than changing the buffer of the batch it came from
+            self.img_values = self.img_values.copy()
+        colours = colour_map_matrix(self.array[indices].reshape(1, -1), self.cmap, self.vmin, self.vmax)
+        self.img_values[:, indices] = colours
+        if self.label_mode == "atlas":
+            colours = stamp_labels(colours, self._label_texts(indices), cell_px=self.cell_px)
+        for i, idx in enumerate(indices):
+            self.cell_pixels(idx)[..., :3] = colours[:, i * self.cell_px:(i + 1) * self.cell_px]
+
+    def set_values(self, values, indices=None):
+        """
+        Change the values of the given cells (all cells by default), recolouring and relabelling only those cells.
+        """
+        indices = np.arange(self.n_cells) if indices is None else np.atleast_1d(indices)
+        self.array[indices] = np.asarray(values, dtype=float).ravel()
+        self._paint(indices)
+        if self.label_mode == "tex":
+            for idx, text in zip(indices, self._label_texts(indices)):
+                old_label = self.labels[idx]
+                label = self._create_label(text, idx).set_z_index(old_label.z_index)
+                self.submobjects[self.submobjects.index(old_label)] = label
+                self.labels[idx] = label
+        return self
+
+    def recolour(self, cmap=None, vmin=None, vmax=None, indices=None):
+        """
+        Change the colour map and/or its range, recolouring the given cells (all cells by default).
+        """
+        if cmap is not None:
+            self.cmap = cmap
+        if vmin is not None:
+            self.vmin = vmin
+        if vmax is not None:
+            self.vmax = vmax
+        self._paint(np.arange(self.n_cells) if indices is None else np.atleast_1d(indices))
+        return self
+
+    def subarray(self, start, stop):
+        """
+        A new array of cells start to stop, placed over those cells.
+        It reuses their colours (and labels), so only the cells in the slice are copied.
+        """
+        sub = ArrayMobject(self.array[start:stop], self.cmap, self.vmin, self.vmax,
+                           img_values=self.img_values[:, start:stop], label_mode=self.label_mode)
+        sub.scale(self.image.height)
+        sub.move_to((self.cell_center(start) + self.cell_center(stop - 1)) / 2)
+        sub.set_z_index(self.z_index)
+        return sub
+
+    def split_cells(self):
+        """
+        Split the array into single cell arrays, placed over the original cells.
+        """
+        return [self.subarray(idx, idx + 1) for idx in range(self.n_cells)]
+
+
+class BagMatrixMobject(Group):
     """
-    A way to represent arrays in Manim.
-    # TODO it doesn't actually subclass Mobject, which it should
+    A whole bag of arrays (an N x F matrix) drawn as a single texture, one row per instance.
+    However big the bag, this is one mobject, so it stays cheap to sort and render.
+
+    Rows can be laid out like a column of a PipelineLayout (see PipelineLayout.matrix_geometry): row_pitch cells apart,
+    wrapping into n_wraps sub-columns that are wrap_gap cells apart, with the gaps left transparent.
+
+    Rows are only turned into their own mobjects (ArrayMobjects) when they need to be animated (see extract_row);
+    every other row stays in the shared texture, where it can still be faded in and out (see FadeRows).
+    Labels are rasterized into the texture from the digit atlas if show_labels is set (which needs atlas_cell_px
+    pixels per cell, so it's best kept for smaller bags).
     """
 
-    def __init__(self, array, cmap, vmin, vmax):
-        self.array = array
+    def __init__(self, matrix, cmap, vmin, vmax, img_values=None, show_labels=False, row_pitch=1, n_wraps=1,
+                 wrap_gap=0, **kwargs):
+        super().__init__(**kwargs)
+        self.matrix = np.array(matrix, dtype=float).reshape(len(matrix), -1)
         self.cmap = cmap
-        self.img_values = self._calculate_img_values(vmin, vmax)
-
-    def _calculate_img_values(self, vmin, vmax):
-        img_values = np.empty((1, len(self.array), 3))
-        norm = mpl.colors.Normalize(vmin=vmin, vmax=vmax)
-        for idx, v in enumerate(self.array):
-            img_values[:, idx, :] = self.cmap(norm(v.item()))[:3]
-        img_values *= 255
-        img_values = img_values.astype(np.uint8)
-        return img_values
-
-    def create_mobject(self):
-        # Tensor coloured squares
-        img = ImageMobject(self.img_values)
-        img.set_resampling_algorithm(RESAMPLING_ALGORITHMS["nearest"])
-        img.height = 1
-
-        # Labels for each square
-        labels = []
-        for idx, v in enumerate(self.array):
-            # TODO sort out -0.0 labels
-            label = MathTex("{:.1f}".format(v.item())).set_color(WHITE).scale(0.8)
-            label.move_to(img.get_center()).shift(RIGHT * (idx - (len(self.array) - 1)/2))
-            labels.append(label)
-
-        # Group together and return
-        group = Group()
-        group.add(img, *labels)
-        return group
-
-    def create_splits(self):
-        splits = []
-        for idx in range(len(self.array)):
-            print(self.img_values[:, idx, :])
-            img = ImageMobject([self.img_values[:, idx, :]])
-            img.set_resampling_algorithm(RESAMPLING_ALGORITHMS["nearest"])
-            img.height = 1
-            label = MathTex("{:.1f}".format(self.array[idx].item())).set_color(WHITE).scale(0.8)
-            label.move_to(img.get_center())
-            group = Group()
-            group.add(img, label)
-            splits.append(group)
-        return splits
-
-
-def calculate_angle(mobject_1, mobject_2):
-    """
-    Calculate the angle between two mobjects.
-    """
-    dx = mobject_2.get_x() - mobject_1.get_x()
-    dy = mobject_2.get_y() - mobject_1.get_y()
-    angle = math.atan2(dy, dx)
-    return angle
+        self.vmin = vmin
+        self.vmax = vmax
+        if img_values is None:
+            img_values = colour_map_matrix(self.matrix, cmap, vmin, vmax)
+        # Colour of each cell (N x F x 3), without labels
+        self.img_values = img_values
+        self.n_wraps = n_wraps
+        self.rows_per_wrap = math.ceil(self.n_rows / n_wraps)
+        # Opacity of each row in the texture
+        self.row_opacity = np.ones(self.n_rows)
+
+        if show_labels:
+            self.cell_px = ArrayMobject.atlas_cell_px
+            rows = np.concatenate([stamp_labels(img_values[idx:idx + 1], self._label_texts(idx), self.cell_px)
+                                   for idx in range(self.n_rows)])
+        else:
+            # Fewest pixels per cell that make the gaps between rows and sub-columns whole pixels
+            self.cell_px = next((px for px in range(1, ArrayMobject.atlas_cell_px)
+                                 if _is_whole(row_pitch * px) and _is_whole(wrap_gap * px)), ArrayMobject.atlas_cell_px)
+            rows = np.repeat(np.repeat(img_values, self.cell_px, axis=0), self.cell_px, axis=1)
+        # Each row starts pitch_px below the previous one, and each sub-column block_px right of the previous one
+        self.pitch_px = round(row_pitch * self.cell_px)
+        self.block_px = self.n_cols * self.cell_px + round(wrap_gap * self.cell_px)
+
+        texture = np.zeros((self.rows_per_wrap * self.pitch_px, n_wraps * self.block_px, 4), dtype=np.uint8)
+        row_px = np.zeros((n_wraps * self.rows_per_wrap, self.cell_px, self.n_cols * self.cell_px, 4), dtype=np.uint8)
+        row_px[:self.n_rows, ..., :3] = rows.reshape(self.n_rows, self.cell_px, -1, 3)
+        row_px[:self.n_rows, ..., 3] = 255
+        # Sub-columns are filled top to bottom, as in PipelineLayout
+        row_px = row_px.reshape(n_wraps, self.rows_per_wrap, *row_px.shape[1:])
+        self._cells(texture)[...] = row_px.transpose(1, 2, 0, 3, 4)
+        self.image = ImageMobject(texture)
+        self.image.set_resampling_algorithm(RESAMPLING_ALGORITHMS["nearest"])
+        # Each cell is a unit square until the matrix is scaled
+        self.image.height = texture.shape[0] / self.cell_px
+        self.add(self.image)
+
+    @classmethod
+    def from_batch(cls, batch, show_labels=False, **kwargs):
+        """
+        Create the matrix for an ArrayBatch, sharing the batch's colour mapped buffer.
+        """
+        return cls(batch.matrix, batch.cmap, batch.vmin, batch.vmax, img_values=batch.img_values,
+                   show_labels=show_labels, **kwargs)
+
+    @property
+    def n_rows(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_cols(self):
+        return self.matrix.shape[1]
+
+    @property
+    def cell_height(self):
+        return self.image.height * self.cell_px / self.image.pixel_array.shape[0]
+
+    def _label_texts(self, idx):
+        return ["{:.1f}".format(v) for v in self.matrix[idx]]
+
+    def _cells(self, pixels):
+        """
+        View of the rows' cells in a texture, indexed by (row in sub-column, pixel row, sub-column, pixel col, channel).
+        """
+        cells = pixels.view()
+        # Assigning the shape (rather than reshaping) makes sure this is a view, so writes reach the texture
+        cells.shape = (self.rows_per_wrap, self.pitch_px, self.n_wraps, self.block_px, 4)
+        return cells[:, :self.cell_px, :, :self.n_cols * self.cell_px]
+
+    def cell_center(self, row, col):
+        """
+        Centre of a cell in the scene (following any moves, scaling or rotation of the matrix).
+        """
+        upper_left, upper_right, lower_left = self.image.points[:3]
+        height, width = self.image.pixel_array.shape[:2]
+        top = (row % self.rows_per_wrap) * self.pitch_px + self.cell_px / 2
+        left = (row // self.rows_per_wrap) * self.block_px + (col + 0.5) * self.cell_px
+        return upper_left + (upper_right - upper_left) * left / width + (lower_left - upper_left) * top / height
+
+    def row_center(self, idx):
+        return (self.cell_center(idx, 0) + self.cell_center(idx, self.n_cols - 1)) / 2
+
+    def move_row_to(self, idx, point):
+        """
+        Move the matrix so that the given row is centred on point.
+        """
+        return self.shift(np.asarray(point, dtype=float) - self.row_center(idx))
+
+    def row_pixels(self, idx):
+        """
+        View of a row's pixels (RGBA) in the texture. Writing to it changes how the row is drawn.
+        """
+        return self._cells(own_pixels(self.image))[idx % self.rows_per_wrap, :, idx // self.rows_per_wrap]
+
+    def set_row_opacity(self, indices, opacity):
+        """
+        Fade the given rows in the texture, e.g. to dim every row but the ones being explained.
+        opacity is either one opacity for all the rows, or one per row.
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=int))
+        self.row_opacity[indices] = opacity
+        cells = self._cells(own_pixels(self.image))
+        alpha = np.round(self.row_opacity[indices] * 255).astype(np.uint8)
+        cells[indices % self.rows_per_wrap, :, indices // self.rows_per_wrap, :, 3] = alpha[:, None, None]
+        return self
+
+    def extract_row(self, idx, label_mode=None):
+        """
+        Lift a row out of the texture as an ArrayMobject placed over it, so the row can be animated on its own.
+        The row is hidden in the texture until restore_row is called.
+        """
+        row = ArrayMobject(self.matrix[idx], self.cmap, self.vmin, self.vmax, img_values=self.img_values[idx:idx + 1],
+                           label_mode=label_mode)
+        row.scale(self.cell_height)
+        row.move_to(self.row_center(idx))
+        row.set_z_index(self.z_index)
+        self.set_row_opacity(idx, 0)
+        return row
+
+    def restore_row(self, idx):
+        """
+        Show a row in the texture again (e.g. once its extracted ArrayMobject has been animated back and removed).
+        """
+        return self.set_row_opacity(idx, 1)
+
+    def highlight_row(self, idx, colour=YELLOW, buff=0.05):
+        """
+        A rectangle around a row, for drawing attention to it without extracting it.
+        """
+        width = self.n_cols * self.cell_height
+        rect = Rectangle(width=width + 2 * buff, height=self.cell_height + 2 * buff, color=colour)
+        return rect.move_to(self.row_center(idx)).set_z_index(self.z_index + 1)
+
+
+def _is_whole(value):
+    return abs(value - round(value)) < 1e-6
+
+
+class FadeRows(Animation):
+    """
+    Fade rows of a BagMatrixMobject to the given opacity inside its texture, as a single animation.
+    Each row fades over row_time (a fraction of the run time), starting at its entry in starts (all at once by
+    default). Every frame only updates the rows' alpha in the texture, so no mobject is made per row.
+    """
+
+    def __init__(self, matrix, indices, opacity, starts=0, row_time=1, **kwargs):
+        kwargs.setdefault("rate_func", linear)
+        self.indices = np.atleast_1d(np.asarray(indices, dtype=int))
+        self.opacity = opacity
+        self.starts = np.asarray(starts, dtype=float)
+        self.row_time = row_time
+        super().__init__(matrix, **kwargs)
+
+    def create_starting_mobject(self):
+        return self.mobject
+
+    def begin(self):
+        self.start_opacity = self.mobject.row_opacity[self.indices].copy()
+        super().begin()
+
+    def interpolate_mobject(self, alpha):
+        row_alpha = np.clip((self.rate_func(alpha) - self.starts) / self.row_time, 0, 1)
+        self.mobject.set_row_opacity(self.indices, interpolate(self.start_opacity, self.opacity, row_alpha))
+
+
+class PredictionMask(ImageMobject):
+    """
+    Patch prediction mask: every patch of the grid filled with the colour of its predicted class.
+    The whole grid is a single RGBA texture (one pixel per patch), however many patches there are.
+    """
+
+    def __init__(self, instance_preds, grid_size, class_colours, opacity=0.5, **kwargs):
+        # Instance predictions are in row-major patch order
+        self.classes = np.argmax(np.asarray(instance_preds), axis=1).reshape(grid_size)
+        self.opacity = opacity
+        palette = np.array([color_to_int_rgb(c) for c in class_colours], dtype=np.uint8)
+        texture = np.empty(tuple(grid_size) + (4,), dtype=np.uint8)
+        texture[..., :3] = palette[self.classes]
+        texture[..., 3] = int(round(opacity * 255))
+        super().__init__(texture, **kwargs)
+        self.set_resampling_algorithm(RESAMPLING_ALGORITHMS["nearest"])
+        # Each patch is a unit square until the mask is scaled
+        self.height = grid_size[0]
+
+    def cell_center(self, row, col):
+        """
+        Centre of a patch in the scene.
+        """
+        n_rows, n_cols = self.classes.shape
+        upper_left, upper_right, lower_left = self.points[:3]
+        return (upper_left + (upper_right - upper_left) * (col + 0.5) / n_cols
+                + (lower_left - upper_left) * (row + 0.5) / n_rows)
+
+
+class RevealMask(Animation):
+    """
+    Fade a PredictionMask in patch by patch (in row-major order) as a single animation.
+    Each patch's fade lasts patch_time (as a fraction of the run time); the patches' fades are spread evenly.
+    Every frame only updates the mask's alpha channel, so the cost doesn't depend on the number of patches.
+    """
+
+    def __init__(self, mask, patch_time=0.3, **kwargs):
+        n_patches = mask.classes.size
+        self.starts = (np.arange(n_patches) / max(n_patches - 1, 1) * (1 - patch_time)).reshape(mask.classes.shape)
+        self.patch_time = patch_time
+        super().__init__(mask, introducer=True, **kwargs)
+
+    def interpolate_mobject(self, alpha):
+        alpha = self.rate_func(alpha)
+        patch_alpha = np.clip((alpha - self.starts) / self.patch_time, 0, 1)
+        self.mobject.pixel_array[..., 3] = np.round(patch_alpha * self.mobject.opacity * 255).astype(np.uint8)
+
+
+class BagStage:
+    """
+    Splits a per-instance pipeline stage (e.g. feature extraction) into the first few instances, which are
+    animated one at a time, and the rest of the bag, which is animated in a single staggered play.
+    The batched part always lasts batch_time, so a stage takes about the same time for any bag size.
+    """
+
+    def __init__(self, n_instances, n_detailed=3, batch_time=5, lag_ratio=0.2, max_individual=100):
+        self.detailed = range(min(n_detailed, n_instances))
+        self.batched = range(len(self.detailed), n_instances)
+        self.batch_time = batch_time
+        self.lag_ratio = lag_ratio
+        # Whether every instance is animated as its own mobject: bags bigger than max_individual keep their batched
+        # instances as rows of a BagMatrixMobject (see fade_rows)
+        self.individual = n_instances <= max_individual
+
+    def batch_animation(self, instance_anims):
+        """
+        Stagger a list of per-instance animation lists into a single animation.
+        """
+        return LaggedStart(*[AnimationGroup(*anims) for anims in instance_anims],
+                           lag_ratio=self.lag_ratio, run_time=self.batch_time)
+
+    def fade_rows(self, matrix, indices, opacity):
+        """
+        Fade batched instances that are rows of a BagMatrixMobject, staggered as batch_animation staggers them.
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=int))
+        # Each instance's share of the run time, as LaggedStart lays them out
+        row_time = 1 / (1 + self.lag_ratio * max(len(self.batched) - 1, 0))
+        starts = (indices - self.batched.start) * self.lag_ratio * row_time
+        return FadeRows(matrix, indices, opacity, starts, row_time, run_time=self.batch_time)
+
+
+class AimSweep(Animation):
+    """
+    Turn a filter (funnel) to point at each of the given points in turn, then back to how it started, at a steady pace.
+    The filter's opening should start facing left (as created by create_filter and rotated by PI/2).
+
+    Every angle is computed up front, and each frame sets the filter's orientation from its starting points rather than
+    rotating it again, so no rounding error builds up over the sweep however many points there are.
+    Use take_in to time animations of the instances (e.g. shrinking into the filter) to match the sweep.
+    """
+
+    def __init__(self, mobject, points, about_point=None, **kwargs):
+        kwargs.setdefault("rate_func", linear)
+        self.about_point = np.array(mobject.get_center_of_mass() if about_point is None else about_point, dtype=float)
+        offsets = self.about_point - np.asarray(points, dtype=float)
+        # Rotation that turns the opening to face each point, unwrapped so the sweep never spins the long way round
+        angles = np.unwrap(np.concatenate([[0], np.arctan2(offsets[:, 1], offsets[:, 0]), [0]]))
+        self.keyframes = np.linspace(0, 1, len(angles))
+        self.angles = angles
+        super().__init__(mobject, **kwargs)
+
+    def create_starting_mobject(self):
+        return self.mobject
+
+    def begin(self):
+        self.start_points = [(mob, mob.points - self.about_point)
+                             for mob in self.mobject.get_family() if len(mob.points) > 0]
+        super().begin()
+
+    def interpolate_mobject(self, alpha):
+        angle = np.interp(self.rate_func(alpha), self.keyframes, self.angles)
+        cos, sin = math.cos(angle), math.sin(angle)
+        rotation = np.array([[cos, sin, 0], [-sin, cos, 0], [0, 0, 1]])
+        for mob, points in self.start_points:
+            mob.points = points @ rotation + self.about_point
+
+    def take_in(self, instance_anims):
+        """
+        Combine a list of per-point animation lists into a single animation to play alongside the sweep, in which each
+        point's animations run from when the filter points at it until it points at the next.
+        """
+        step = self.keyframes[1]
+        anims = []
+        for idx, point_anims in enumerate(instance_anims):
+            start = self.keyframes[idx + 1]
+            for anim in point_anims:
+                anim.rate_func = squish_rate_func(anim.rate_func, start, min(start + step, 1))
+                anim.run_time = self.run_time
+                anims.append(anim)
+        return AnimationGroup(*anims, run_time=self.run_time)
+
+    def fade_rows(self, matrix, indices, opacity):
+        """
+        Like take_in, for points that are rows of a BagMatrixMobject fading inside its texture (the row indices are the
+        indices of their points).
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=int))
+        return FadeRows(matrix, indices, opacity, starts=self.keyframes[indices + 1], row_time=self.keyframes[1],
+                        run_time=self.run_time)
 
 
+@profiled("create_filter")
 def create_filter(colour):
     """
     Create a filter (funnel) object using Manim's Polygon class